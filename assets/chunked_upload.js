@@ -0,0 +1,109 @@
+/* Subida por chunks para #upload-data.
+ *
+ * Intercepta el archivo elegido/soltado en el dcc.Upload antes de que el
+ * componente lo lea como base64 y lo manda en trozos binarios a
+ * /upload/<id> (ver index.py). Si un trozo falla se pregunta al servidor
+ * cuántos bytes tiene y se reanuda desde ahí. Al terminar, solo se pasa el
+ * token a Dash ("upload-token"); el servidor ya está parseando el archivo.
+ */
+(function () {
+    var CHUNK_SIZE = 4 * 1024 * 1024;  // 4 MB por request
+    var MAX_RETRIES = 5;
+
+    function inUpload(el) {
+        return el && el.closest && el.closest("#upload-data");
+    }
+
+    function newId() {
+        var bytes = new Uint8Array(16);
+        window.crypto.getRandomValues(bytes);
+        return Array.prototype.map.call(bytes, function (b) {
+            return ("0" + b.toString(16)).slice(-2);
+        }).join("");
+    }
+
+    function setText(txt) {
+        var el = document.getElementById("upload-text");
+        if (el) {
+            el.textContent = txt;
+        }
+    }
+
+    function sleep(ms) {
+        return new Promise(function (resolve) { setTimeout(resolve, ms); });
+    }
+
+    async function serverOffset(id, size) {
+        var r = await fetch("/upload/" + id);
+        var js = await r.json();
+        return js.complete ? size : (js.received || 0);
+    }
+
+    async function sendFile(file) {
+        var id = newId();
+        var offset = 0;
+        var retries = 0;
+
+        setText("Uploading " + file.name + "… 0%");
+        do {
+            var chunk = file.slice(offset, offset + CHUNK_SIZE);
+            try {
+                var r = await fetch("/upload/" + id, {
+                    method: "POST",
+                    headers: {
+                        "Content-Type": "application/octet-stream",
+                        "X-Upload-Offset": String(offset),
+                        "X-Upload-Total": String(file.size),
+                        "X-Upload-Filename": encodeURIComponent(file.name),
+                    },
+                    body: chunk,
+                });
+                if (!r.ok) {
+                    throw new Error("HTTP " + r.status);
+                }
+                var js = await r.json();
+                offset = js.received;
+                retries = 0;
+            } catch (err) {
+                retries += 1;
+                if (retries > MAX_RETRIES) {
+                    setText("Error uploading file. Try again.");
+                    return;
+                }
+                await sleep(1000 * retries);
+                try {
+                    offset = await serverOffset(id, file.size);
+                } catch (e) {
+                    // se reintenta desde el mismo offset
+                }
+            }
+            var pct = file.size ? Math.floor((100 * offset) / file.size) : 100;
+            setText("Uploading " + file.name + "… " + pct + "%");
+        } while (offset < file.size);
+
+        setText("Processing " + file.name + "…");
+        window.dash_clientside.set_props("upload-token", {
+            data: {token: id, filename: file.name},
+        });
+    }
+
+    // Fase de captura: el dcc.Upload (react-dropzone) nunca ve el archivo
+    window.addEventListener("change", function (ev) {
+        var input = ev.target;
+        if (input.type !== "file" || !inUpload(input) || !input.files.length) {
+            return;
+        }
+        ev.stopImmediatePropagation();
+        sendFile(input.files[0]);
+        input.value = "";
+    }, true);
+
+    window.addEventListener("drop", function (ev) {
+        if (!inUpload(ev.target) || !ev.dataTransfer || !ev.dataTransfer.files.length) {
+            return;
+        }
+        ev.preventDefault();
+        ev.stopImmediatePropagation();
+        sendFile(ev.dataTransfer.files[0]);
+    }, true);
+})();
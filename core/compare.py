@@ -0,0 +1,167 @@
+# core/compare.py
+# Motor de "Before vs After" para N cortes y M columnas a la vez.
+# El dataset está ordenado por tiempo (NaT al final), así que los cortes se
+# ubican con un solo searchsorted. Las estadísticas de cada tramo se calculan
+# para todas las columnas juntas: un sort por tramo da mediana y percentiles
+# (interpolación lineal, como np.nanpercentile) sin pasadas extra.
+# Con el handle del dataset se usa el índice de core.windows: n/media/desvío
+# de todos los tramos de una columna con una lectura de sus sumas acumuladas
+# y percentiles por sketches (exactos en tramos chicos), un tramo a la vez.
+# n es la cantidad de valores no NaN del tramo (no de filas).
+import numpy as np
+import pandas as pd
+
+from core import windows
+
+STATS = ["n", "mean", "std", "p5", "p50", "p95"]
+PERCENTILES = (5, 50, 95)
+
+
+# times: datetime64 ordenado; cutoffs: fechas. Devuelve los límites
+# [0, i1, ..., n_valid] de cada tramo (tramo k = filas bounds[k]:bounds[k+1]).
+def split_bounds(times, cutoffs):
+    times = np.asarray(times, dtype="datetime64[ns]")
+    n_valid = len(times) - int(np.count_nonzero(np.isnat(times)))
+    # Cada corte por separado: pd.to_datetime de una lista infiere un solo
+    # formato y falla con "2024-01-03" junto a "2024-01-05 07:13"
+    cuts = np.sort(np.array([pd.Timestamp(c).to_datetime64() for c in cutoffs], dtype="datetime64[ns]"))
+    # side="left": el corte cae en el tramo de después (t >= corte), igual
+    # que el Before/After original
+    inner = np.searchsorted(times[:n_valid], cuts, side="left")
+    return np.concatenate(([0], inner, [n_valid])).astype("int64")
+
+
+def _percentiles(seg, counts, qs):
+    # NaN quedan al final de cada columna tras el sort
+    ordered = np.sort(seg, axis=0)
+    out = np.full((len(qs), seg.shape[1]), np.nan)
+    has = counts > 0
+    if not has.any():
+        return out
+    last = np.maximum(counts - 1, 0)
+    for i, q in enumerate(qs):
+        pos = q / 100.0 * last
+        lo = np.floor(pos).astype("int64")
+        hi = np.minimum(lo + 1, last)
+        frac = pos - lo
+        v_lo = np.take_along_axis(ordered, lo[None, :], axis=0)[0]
+        v_hi = np.take_along_axis(ordered, hi[None, :], axis=0)[0]
+        out[i] = np.where(has, v_lo + (v_hi - v_lo) * frac, np.nan)
+    return out
+
+
+# values: array (filas, columnas) float64. Devuelve {stat: array (tramos, columnas)}
+def segment_stats(values, bounds):
+    values = np.asarray(values, dtype="float64")
+    n_seg, n_col = len(bounds) - 1, values.shape[1]
+    out = {s: np.full((n_seg, n_col), np.nan) for s in STATS}
+    for k in range(n_seg):
+        seg = values[bounds[k]:bounds[k + 1]]
+        valid = ~np.isnan(seg)
+        counts = valid.sum(axis=0)
+        out["n"][k] = counts
+        if not len(seg):
+            continue
+        filled = np.where(valid, seg, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = filled.sum(axis=0) / counts
+            dev = np.where(valid, seg - mean, 0.0)
+            std = np.sqrt((dev * dev).sum(axis=0) / counts)
+        out["mean"][k] = np.where(counts > 0, mean, np.nan)
+        out["std"][k] = np.where(counts > 0, std, np.nan)
+        for q, row in zip(PERCENTILES, _percentiles(seg, counts, PERCENTILES)):
+            out[f"p{q}"][k] = row
+    return out
+
+
+def segment_labels(cutoffs):
+    cuts = sorted(pd.Timestamp(c) for c in cutoffs)
+    if len(cuts) == 1:
+        return ["Before", "After"]
+    fmt = [c.strftime("%Y-%m-%d") for c in cuts]
+    labels = [f"Before {fmt[0]}"]
+    labels += [f"{a} → {b}" for a, b in zip(fmt[:-1], fmt[1:])]
+    labels.append(f"After {fmt[-1]}")
+    return labels
+
+
+# Mismo resultado que segment_stats, desde el índice de ventanas de cada
+# columna (sin leer los tramos completos)
+def indexed_stats(handle, columns, bounds):
+    bounds = np.asarray(bounds, dtype="int64")
+    n_seg = len(bounds) - 1
+    out = {s: np.full((n_seg, len(columns)), np.nan) for s in STATS}
+    for j, col in enumerate(columns):
+        idx = windows.get(handle, col)
+        m = windows.segment_moments(idx, bounds)
+        out["n"][:, j] = m["count"]
+        out["mean"][:, j] = m["mean"]
+        out["std"][:, j] = m["std"]
+        for k in range(n_seg):
+            qs = windows.quantiles(idx, int(bounds[k]), int(bounds[k + 1]), PERCENTILES)
+            for q, v in zip(PERCENTILES, qs):
+                out[f"p{q}"][k, j] = v
+    return out
+
+
+# Estadísticas de una caja para las filas [a, b) de una columna (criterio de
+# Tukey, igual que Plotly): cuartiles desde core.windows, media/desvío por
+# sumas acumuladas, bigotes y outliers en una pasada vectorizada. outliers:
+# muestra de a lo sumo max_outliers, equiespaciada en rango (incluye los
+# extremos). None si el tramo no tiene datos.
+MAX_OUTLIERS = 100
+
+
+def box_stats(idx, a, b, max_outliers=MAX_OUTLIERS):
+    v = np.asarray(idx["values"][a:b])
+    v = v[~np.isnan(v)]
+    if not len(v):
+        return None
+    q1, median, q3 = windows.quantiles(idx, a, b, [25, 50, 75])
+    m = windows.moments(idx, a, b)
+    iqr = q3 - q1
+    inside = (v >= q1 - 1.5 * iqr) & (v <= q3 + 1.5 * iqr)
+    outliers = np.sort(v[~inside])
+    n_outliers = len(outliers)
+    if n_outliers > max_outliers:
+        outliers = outliers[np.linspace(0, n_outliers - 1, max_outliers).round().astype("int64")]
+    return {
+        "q1": float(q1),
+        "median": float(median),
+        "q3": float(q3),
+        "lowerfence": float(v[inside].min()) if inside.any() else float(q1),
+        "upperfence": float(v[inside].max()) if inside.any() else float(q3),
+        "mean": m["mean"],
+        "sd": m["std"],
+        "outliers": outliers,
+        "n_outliers": n_outliers,
+    }
+
+
+# Tabla larga (una fila por columna y tramo) con el cambio de la media
+# respecto del primer tramo
+def compare(df, columns, cutoffs, handle=None):
+    time_col = df.columns[0]
+    bounds = split_bounds(df[time_col].to_numpy(), cutoffs)
+    if handle is not None:
+        stats = indexed_stats(handle, columns, bounds)
+    else:
+        values = df[list(columns)].to_numpy(dtype="float64", na_value=np.nan)
+        stats = segment_stats(values, bounds)
+    labels = segment_labels(cutoffs)
+
+    rows = []
+    for j, col in enumerate(columns):
+        base_mean = stats["mean"][0, j]
+        for k, label in enumerate(labels):
+            row = {"parameter": col, "segment": label}
+            row.update({s: float(stats[s][k, j]) for s in STATS})
+            row["n"] = int(stats["n"][k, j])
+            mean = stats["mean"][k, j]
+            row["delta_mean_pct"] = (
+                float((mean - base_mean) / abs(base_mean) * 100.0)
+                if k > 0 and base_mean and not np.isnan(base_mean) and not np.isnan(mean)
+                else None
+            )
+            rows.append(row)
+    return {"bounds": bounds.tolist(), "labels": labels, "rows": rows}
@@ -0,0 +1,162 @@
+# core/compliance.py
+# Cumplimiento de target para varios tags a la vez (revisión mensual).
+# Los días de la ventana se ubican con un solo searchsorted sobre el tiempo
+# del dataset y los conteos por día de cada tag salen del índice de
+# core.windows (búsqueda binaria en bloques ordenados + bordes exactos). Con
+# la matriz tags x días, el % por día y la curva móvil de N días son sumas
+# acumuladas sobre el eje de días.
+#
+# También: cumplimiento ponderado por tiempo y excursiones (run-length) de
+# una serie, para el modal de Target.
+import numpy as np
+import pandas as pd
+
+from core import windows
+
+# Un hueco entre muestras pesa a lo sumo GAP_FACTOR intervalos típicos: un
+# corte del historian no cuenta como horas dentro o fuera de banda
+GAP_FACTOR = 5
+
+BELOW, WITHIN, ABOVE, MISSING = -1, 0, 1, 2
+
+
+# targets: [{"tag", "target", "tol"}]; start/end: fechas (día de fin
+# incluido); days: largo de la ventana móvil. None si no hay días o tags.
+def batch(handle, targets, start, end, days=7):
+    day_starts = pd.date_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize(), freq="D")
+    if not len(day_starts):
+        return None
+    edges_time = np.append(day_starts.asi8, (day_starts[-1] + pd.Timedelta(days=1)).value)
+
+    tags, below, within, above, edges = [], [], [], [], None
+    for t in targets:
+        idx = windows.get(handle, t["tag"])
+        if idx is None:
+            continue
+        if edges is None:
+            # Todas las columnas comparten el mismo tiempo
+            edges = np.searchsorted(idx["time"], edges_time, side="left")
+        b, w, a = windows.band_counts(idx, edges, t["target"] - t["tol"], t["target"] + t["tol"])
+        tags.append(t)
+        below.append(b)
+        within.append(w)
+        above.append(a)
+    if not tags:
+        return None
+
+    below, within, above = np.vstack(below), np.vstack(within), np.vstack(above)
+    rows_per_day = np.diff(edges)   # mismo denominador que los KPIs de Target
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        daily = np.where(rows_per_day > 0, 100.0 * within / rows_per_day, np.nan)
+        # Ventana móvil de `days` días (los primeros días usan los que hay)
+        days = max(1, int(days))
+        cw = np.concatenate((np.zeros((len(tags), 1)), np.cumsum(within, axis=1)), axis=1)
+        cn = np.concatenate(([0], np.cumsum(rows_per_day)))
+        hi = np.arange(1, len(rows_per_day) + 1)
+        lo = np.maximum(hi - days, 0)
+        n_roll = cn[hi] - cn[lo]
+        rolling = np.where(n_roll > 0, 100.0 * (cw[:, hi] - cw[:, lo]) / n_roll, np.nan)
+
+    total = int(rows_per_day.sum())
+    rows = []
+    for k, t in enumerate(tags):
+        valid_days = daily[k][~np.isnan(daily[k])]
+        rows.append({
+            "tag": t["tag"],
+            "target": t["target"],
+            "tol": t["tol"],
+            "samples": total,
+            "below": int(below[k].sum()),
+            "within": int(within[k].sum()),
+            "above": int(above[k].sum()),
+            "pct_in": 100.0 * within[k].sum() / total if total else float("nan"),
+            "worst_day": float(valid_days.min()) if len(valid_days) else float("nan"),
+            "best_day": float(valid_days.max()) if len(valid_days) else float("nan"),
+        })
+    return {
+        "days": [d.strftime("%Y-%m-%d") for d in day_starts],
+        "rows": rows,
+        "daily": daily,
+        "rolling": rolling,
+        "window": days,
+    }
+
+
+# -----------------------------
+# Ponderado por tiempo + excursiones
+# -----------------------------
+# (intervalos entre muestras consecutivas en ns, intervalo típico)
+def _steps(times):
+    dt = np.diff(np.asarray(times).view("int64")).astype("float64")
+    return dt, float(np.median(dt)) if len(dt) else 0.0
+
+
+# gaps[k]: entre la muestra k y la k+1 hay un hueco (más de GAP_FACTOR
+# intervalos típicos)
+def gaps(times):
+    dt, typical = _steps(times)
+    if typical <= 0:
+        return np.zeros(len(dt), dtype=bool)
+    return dt > GAP_FACTOR * typical
+
+
+# Segundos que representa cada muestra: hasta la siguiente (la última, el
+# intervalo típico), con los huecos recortados
+def durations(times):
+    if not len(times):
+        return np.zeros(0)
+    dt, typical = _steps(times)
+    dt = np.append(dt, typical)
+    if typical > 0:
+        np.minimum(dt, GAP_FACTOR * typical, out=dt)
+    return dt / 1e9
+
+
+def band_states(values, low, high):
+    v = np.asarray(values, dtype="float64")
+    states = np.full(len(v), WITHIN, dtype="int8")
+    states[v < low] = BELOW
+    states[v > high] = ABOVE
+    states[np.isnan(v)] = MISSING
+    return states
+
+
+# times/values: la ventana (tiempo ordenado). Devuelve (stats, eventos);
+# eventos: arrays "start", "end", "kind" (BELOW | ABOVE), "secs" de cada
+# excursión (fin = última muestra + su duración). Un hueco sin datos (ver
+# gaps) corta la excursión: del otro lado empieza otra.
+def excursions(times, values, low, high):
+    times = np.asarray(times).view("datetime64[ns]")
+    weights = durations(times)
+    states = band_states(values, low, high)
+    n = len(states)
+    if not n:
+        return {}, {"start": times[:0], "end": times[:0], "kind": states, "secs": np.zeros(0)}
+
+    # Run-length encoding: inicio de cada tramo de estado constante y sin
+    # huecos
+    starts = np.flatnonzero(np.concatenate(([True], (states[1:] != states[:-1]) | gaps(times))))
+    ends = np.append(starts[1:], n)
+    kinds = states[starts]
+    cw = np.concatenate(([0.0], np.cumsum(weights)))
+    run_secs = cw[ends] - cw[starts]
+
+    secs = {k: float(weights[states == k].sum()) for k in (BELOW, WITHIN, ABOVE)}
+    known = secs[BELOW] + secs[WITHIN] + secs[ABOVE]
+    out_runs = (kinds == BELOW) | (kinds == ABOVE)
+    stats = {
+        "pct_time_in": 100.0 * secs[WITHIN] / known if known else float("nan"),
+        "time_below_h": secs[BELOW] / 3600.0,
+        "time_above_h": secs[ABOVE] / 3600.0,
+        "time_out_h": (secs[BELOW] + secs[ABOVE]) / 3600.0,
+        "excursions_below": int(np.count_nonzero(kinds == BELOW)),
+        "excursions_above": int(np.count_nonzero(kinds == ABOVE)),
+        "longest_excursion_h": float(run_secs[out_runs].max()) / 3600.0 if out_runs.any() else 0.0,
+    }
+
+    ev_start = times[starts[out_runs]]
+    last = ends[out_runs] - 1
+    ev_end = times[last] + (weights[last] * 1e9).astype("timedelta64[ns]")
+    events = {"start": ev_start, "end": ev_end, "kind": kinds[out_runs], "secs": run_secs[out_runs]}
+    return stats, events
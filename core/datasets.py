@@ -0,0 +1,157 @@
+# core/datasets.py
+# Registro de datasets en memoria del servidor.
+# Los dcc.Store solo guardan un "handle" pequeño: {"id": ..., "version": ...}
+# Cada versión se guarda también en disco (core.storage) para recargarla con
+# memory-map desde cualquier worker.
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from core import manifest as manifest_mod
+from core import storage
+
+# Cuántas versiones de datasets mantenemos en memoria por proceso (LRU)
+MAX_CACHED_DATASETS = int(os.environ.get("THICKDATA_MAX_DATASETS", "8"))
+
+_lock = threading.Lock()
+_frames = OrderedDict()   # (id, version) -> DataFrame
+_versions = {}            # id -> última versión registrada
+_manifests = {}           # (id, version) -> manifest (pequeño, no se expulsa)
+
+
+# -----------------------------
+# Handles
+# -----------------------------
+def make_handle(dataset_id, version=0):
+    return {"id": dataset_id, "version": int(version)}
+
+
+# Los handles llegan desde dcc.Store (el cliente los puede editar): el id
+# tiene que ser un id de dataset válido y la versión un entero >= 0
+def is_handle(obj):
+    if not isinstance(obj, dict) or not storage.valid_id(obj.get("id")):
+        return False
+    version = obj.get("version")
+    return isinstance(version, int) and not isinstance(version, bool) and version >= 0
+
+
+def _key(handle):
+    if not is_handle(handle):
+        raise ValueError(f"Invalid dataset handle: {handle!r}")
+    return handle["id"], int(handle["version"])
+
+
+# -----------------------------
+# Registro
+# -----------------------------
+# Sin dataset_id se crea un dataset nuevo (versión 0); con dataset_id se
+# registra la siguiente versión libre (p. ej. tras transformaciones).
+def register(df, dataset_id=None):
+    dataset_id, version = _next_version(dataset_id)
+    # El manifest se calcula una sola vez y viaja en meta.json
+    summary = manifest_mod.build(df)
+    # Si otro worker (o hilo) tomó ese número de versión, probamos el siguiente
+    while not storage.save(df, dataset_id, version, extra={"manifest": summary}):
+        version += 1
+    return _registered(dataset_id, version, summary, df)
+
+
+# Nueva versión copy-on-write sobre base: solo se escriben las columnas de
+# columns ({nombre: array}); el resto se comparte con la base (mismos .npy,
+# mismo memory-map), que queda inmutable. Así undo/redo es cambiar de handle.
+def register_overlay(base, columns):
+    base_summary = manifest(base)
+    if base_summary is None:
+        return None
+    dataset_id, version = _next_version(base["id"])
+    summary = manifest_mod.extend(base_summary, columns)
+    extra = {"manifest": summary, "base": make_handle(*_key(base))}
+    while not storage.save_overlay(
+        base["id"], base["version"], columns, dataset_id, version, extra=extra
+    ):
+        version += 1
+    return _registered(dataset_id, version, summary)
+
+
+def _next_version(dataset_id):
+    with _lock:
+        if dataset_id is None:
+            dataset_id = uuid.uuid4().hex
+            version = 0
+        else:
+            on_disk = storage.versions(dataset_id)
+            last = max([_versions.get(dataset_id, -1)] + on_disk)
+            version = last + 1
+        _versions[dataset_id] = version
+    return dataset_id, version
+
+
+def _registered(dataset_id, version, summary, df=None):
+    with _lock:
+        _versions[dataset_id] = max(version, _versions.get(dataset_id, -1))
+        _manifests[(dataset_id, version)] = summary
+    # Nos quedamos con la versión mapeada: la copia parseada se libera
+    mapped = storage.load(dataset_id, version)
+    if mapped is not None or df is not None:
+        _remember((dataset_id, version), mapped if mapped is not None else df)
+    return make_handle(dataset_id, version)
+
+
+def _remember(key, df):
+    with _lock:
+        _frames[key] = df
+        _frames.move_to_end(key)
+        while len(_frames) > MAX_CACHED_DATASETS:
+            _frames.popitem(last=False)
+
+
+# El DataFrame devuelto es compartido: no modificarlo in-place.
+# Con columns solo se mapean desde disco esas columnas (+ tiempo) si el
+# dataset no está ya en memoria.
+def get(handle, columns=None):
+    if not is_handle(handle):
+        return None
+    key = _key(handle)
+    with _lock:
+        df = _frames.get(key)
+        if df is not None:
+            _frames.move_to_end(key)
+    if df is not None:
+        return df
+
+    df = storage.load(key[0], key[1], columns=columns)
+    if df is not None and columns is None:
+        _remember(key, df)
+    return df
+
+
+# Manifest del dataset (ver core.manifest) o None si el handle no existe
+def manifest(handle):
+    if not is_handle(handle):
+        return None
+    key = _key(handle)
+    summary = _manifests.get(key)
+    if summary is not None:
+        return summary
+    meta = storage.read_meta(*key)
+    if meta is None:
+        return None
+    summary = meta.get("manifest")
+    if summary is None:
+        # Dataset escrito antes de existir el manifest
+        df = get(handle)
+        summary = manifest_mod.build(df)
+    with _lock:
+        _manifests[key] = summary
+    return summary
+
+
+# Handle de una versión ya escrita en disco (p. ej. por otro worker), o None
+def lookup(dataset_id, version=0):
+    if not storage.valid_id(dataset_id):
+        return None
+    if (dataset_id, int(version)) in _frames or storage.exists(dataset_id, version):
+        return make_handle(dataset_id, version)
+    return None
+
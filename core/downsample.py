@@ -0,0 +1,44 @@
+# core/downsample.py
+# Decimación min/max por bucket para las series del gráfico principal.
+# En cada bucket se conservan el mínimo y el máximo, así los picos (densidad,
+# torque...) siguen viéndose aunque se manden pocos puntos al navegador.
+import os
+
+import numpy as np
+
+# Puntos máximos por traza que se envían al navegador
+MAX_POINTS_PER_TRACE = int(os.environ.get("THICKDATA_MAX_POINTS", "4000"))
+
+
+def minmax_indices(y, max_points=MAX_POINTS_PER_TRACE):
+    y = np.asarray(y, dtype="float64")
+    n = len(y)
+    if max_points is None or n <= max_points:
+        return np.arange(n)
+
+    # 2 puntos por bucket (min y max) + primero y último
+    buckets = max(1, (max_points - 2) // 2)
+    size = -(-n // buckets)  # ceil
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    blocks = padded.reshape(buckets, size)
+
+    nan = np.isnan(blocks)
+    # Buckets todo NaN -> se toma su primer punto (mantiene el hueco en la línea)
+    i_min = np.argmin(np.where(nan, np.inf, blocks), axis=1)
+    i_max = np.argmax(np.where(nan, -np.inf, blocks), axis=1)
+    offsets = np.arange(buckets) * size
+
+    idx = np.concatenate(([0, n - 1], offsets + i_min, offsets + i_max))
+    idx = idx[idx < n]
+    return np.unique(idx)
+
+
+# Devuelve (x, y, decimado?)
+def decimate(x, y, max_points=MAX_POINTS_PER_TRACE):
+    x = np.asarray(x)
+    y = np.asarray(y)
+    idx = minmax_indices(y, max_points)
+    if len(idx) == len(y):
+        return x, y, False
+    return x[idx], y[idx], True
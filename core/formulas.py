@@ -0,0 +1,163 @@
+# core/formulas.py
+# Columnas definidas por el usuario con fórmulas sobre tags, p. ej.
+#     Solids flux, t/h = [Feed, m3/h] * [Underflow, kg/m3] / 1000
+# Los tags van entre corchetes. La expresión se valida una sola vez (AST con
+# una lista blanca de operaciones y funciones) y se compila a código que
+# opera sobre arrays NumPy completos: no hay bucles por fila en Python.
+import ast
+import re
+from functools import lru_cache
+
+import numpy as np
+
+
+class FormulaError(ValueError):
+    pass
+
+
+_REF_RE = re.compile(r"\[([^\[\]]+)\]")
+
+FUNCTIONS = {
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "log": np.log,
+    "log10": np.log10,
+    "exp": np.exp,
+    "min": np.fmin,        # elemento a elemento, ignora NaN de un lado
+    "max": np.fmax,
+    "clip": np.clip,
+    "where": np.where,     # where(condición, si, no)
+}
+
+_BIN_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod)
+_UNARY_OPS = (ast.UAdd, ast.USub)
+_CMP_OPS = (ast.Gt, ast.GtE, ast.Lt, ast.LtE, ast.Eq, ast.NotEq)
+
+
+def _check(node, names):
+    if isinstance(node, ast.Expression):
+        return _check(node.body, names)
+    if isinstance(node, ast.Constant):
+        if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+            raise FormulaError(f"Only numbers are allowed, got {node.value!r}.")
+        return
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise FormulaError(f"Unknown name '{node.id}'. Put tag names in [brackets].")
+        return
+    if isinstance(node, ast.BinOp) and isinstance(node.op, _BIN_OPS):
+        _check(node.left, names)
+        _check(node.right, names)
+        return
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, _UNARY_OPS):
+        _check(node.operand, names)
+        return
+    if isinstance(node, ast.Compare):
+        # Sin comparaciones encadenadas (a < b < c no funciona con arrays)
+        if len(node.ops) != 1 or not isinstance(node.ops[0], _CMP_OPS):
+            raise FormulaError("Only simple comparisons (a > b) are allowed.")
+        _check(node.left, names)
+        _check(node.comparators[0], names)
+        return
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            allowed = ", ".join(sorted(FUNCTIONS))
+            raise FormulaError(f"Unknown function. Allowed: {allowed}.")
+        if node.keywords:
+            raise FormulaError("Keyword arguments are not allowed.")
+        for arg in node.args:
+            _check(arg, names)
+        return
+    raise FormulaError(f"Unsupported syntax: {type(node).__name__}.")
+
+
+# Expresión -> (tags referenciados, código compilado). Cacheado por texto:
+# cada fórmula se parsea y valida una sola vez por proceso.
+@lru_cache(maxsize=256)
+def compile_expr(expr):
+    refs = []
+
+    def placeholder(match):
+        tag = match.group(1).strip()
+        if tag not in refs:
+            refs.append(tag)
+        return f"__c{refs.index(tag)}"
+
+    source = _REF_RE.sub(placeholder, expr.strip())
+    if not source:
+        raise FormulaError("Empty expression.")
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise FormulaError(f"Syntax error: {e.msg}.") from None
+    names = set(FUNCTIONS) | {f"__c{i}" for i in range(len(refs))}
+    _check(tree, names)
+    # Constantes como float: 10 ** 10 ** 10 desborda a error en vez de
+    # calcular un entero gigante
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant):
+            node.value = float(node.value)
+    return tuple(refs), compile(tree, "<formula>", "eval")
+
+
+# columns: {tag: array float64}; devuelve un array float64 de n filas
+# (inf -> NaN, igual que una división por cero en las conversiones fijas)
+def evaluate(expr, columns, n):
+    refs, code = compile_expr(expr)
+    missing = [r for r in refs if r not in columns]
+    if missing:
+        raise FormulaError(f"Unknown tag [{missing[0]}].")
+    scope = {f"__c{i}": columns[r] for i, r in enumerate(refs)}
+    try:
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            out = eval(code, {"__builtins__": {}, **FUNCTIONS}, scope)  # noqa: S307 (AST validado)
+    except (ArithmeticError, TypeError, ValueError) as e:
+        raise FormulaError(f"Cannot evaluate: {e}.") from None
+    out = np.broadcast_to(np.asarray(out, dtype="float64"), (n,)).copy()
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+# Texto del usuario (una fórmula por línea, "Nombre = expresión") ->
+# [(línea, nombre, expresión)]. Las líneas vacías o que empiezan con # se
+# ignoran.
+def parse_text(text):
+    out = []
+    for lineno, line in enumerate((text or "").splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        # El primer "=" que no es parte de ==, >=, <=, !=
+        match = re.search(r"(?<![=<>!])=(?!=)", line)
+        if match is None:
+            raise FormulaError(f"Line {lineno}: expected 'Name = expression'.")
+        name = line[: match.start()].strip()
+        expr = line[match.end():].strip()
+        if not name:
+            raise FormulaError(f"Line {lineno}: missing column name.")
+        if not expr:
+            raise FormulaError(f"Line {lineno}: missing expression.")
+        out.append((lineno, name, expr))
+    return out
+
+
+# Valida fórmulas contra los tags disponibles (las anteriores también
+# cuentan). Devuelve [(línea, nombre, error | None)].
+def check_text(text, available):
+    available = set(available)
+    results = []
+    try:
+        lines = parse_text(text)
+    except FormulaError as e:
+        return [(None, None, str(e))]
+    for lineno, name, expr in lines:
+        try:
+            refs, _ = compile_expr(expr)
+            missing = [r for r in refs if r not in available]
+            if missing:
+                raise FormulaError(f"Unknown tag [{missing[0]}].")
+            results.append((lineno, name, None))
+            available.add(name)
+        except FormulaError as e:
+            results.append((lineno, name, str(e)))
+    return results
@@ -0,0 +1,327 @@
+# core/ingest.py
+# Lectura del export del historian (Excel/CSV) -> dataset registrado.
+# Las subidas se identifican por el hash de sus bytes: si ya se parseó ese
+# mismo archivo (en este u otro worker, antes o después de reiniciar), se
+# reutiliza la versión en disco y no se vuelve a leer el archivo.
+#
+# Layout esperado del export: 6 filas de cabecera libre, fila 7 con los
+# nombres de los tags y datos desde la fila 8. Solo interesan las columnas
+# D a N (tiempo + 10 tags).
+import csv
+import hashlib
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from core import datasets, pyramid, windows
+
+try:
+    import resource  # solo Unix (gunicorn / Heroku)
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+# Subir este número invalida la caché si cambia la forma de limpiar el archivo
+INGEST_VERSION = 4
+
+HEADER_ROW = 7          # fila (1-based) con los nombres de los tags
+FIRST_COL = 4           # columna D (1-based)
+LAST_COL = 14           # columna N (1-based)
+CHUNK_ROWS = 65536      # filas por bloque al convertir a NumPy
+
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0"
+
+
+# Las fuentes pueden ser bytes (dcc.Upload) o la ruta de un archivo ya
+# escrito en disco (subida por chunks, ver core.uploads)
+def _open(source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def _head(source, n):
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source[:n])
+    with open(source, "rb") as fh:
+        return fh.read(n)
+
+
+def _size(source):
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    return os.path.getsize(source)
+
+
+def content_key(source):
+    h = hashlib.sha256()
+    h.update(f"ingest-v{INGEST_VERSION}".encode())
+    if isinstance(source, (bytes, bytearray)):
+        h.update(source)
+    else:
+        with open(source, "rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:32]
+
+
+def detect_format(source, filename=None):
+    magic = _head(source, 4)
+    if magic == XLSX_MAGIC:
+        return "xlsx"
+    if magic == XLS_MAGIC:
+        return "xls"
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext in (".xlsx", ".xlsm"):
+        return "xlsx"
+    if ext == ".xls":
+        return "xls"
+    return "csv"
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def _column_names(header):
+    # Mismos nombres que daba pd.read_excel: "Unnamed: i" para celdas vacías
+    # y sufijo ".1", ".2"... para duplicados
+    names, seen = [], {}
+    for j, name in enumerate(header):
+        if name is None or (isinstance(name, str) and not name.strip()):
+            name = f"Unnamed: {FIRST_COL - 1 + j}"
+        elif not isinstance(name, str):
+            name = str(name)
+        base, k = name, seen.get(name, 0)
+        while name in seen:
+            k += 1
+            name = f"{base}.{k}"
+        seen[base] = k
+        seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _to_float(v):
+    if v is None or isinstance(v, bool):
+        return np.nan if v is None else float(v)
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _rows_to_array(rows, width):
+    # Camino rápido: conversión en C; si hay texto ("Bad", "#N/A"...) se
+    # convierte celda a celda a NaN
+    try:
+        return np.array(rows, dtype="float64").reshape(len(rows), width)
+    except (TypeError, ValueError):
+        return np.array([[_to_float(v) for v in r] for r in rows], dtype="float64")
+
+
+def _build_frame(names, times, values):
+    # values: (n_tags, n_rows), cada tag contiguo en memoria
+    # Columnas finales sin nombre y vacías = la hoja es más angosta que D–N
+    while len(names) > 1 and names[-1].startswith("Unnamed: ") and np.isnan(values[len(names) - 2]).all():
+        names = names[:-1]
+    data = {names[0]: pd.to_datetime(times, errors="coerce")}
+    for j, name in enumerate(names[1:]):
+        data[name] = values[j]
+    return pd.DataFrame(data, copy=False)
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+# -----------------------------
+# Lectores
+# -----------------------------
+def read_xlsx(source):
+    from openpyxl import load_workbook
+
+    # read_only: se recorre el XML fila a fila sin crear objetos de celda
+    # ni cargar estilos. openpyxl rechaza rutas sin extensión de Excel (la
+    # subida por chunks queda en un .bin): se le pasa el archivo abierto.
+    fh = _open(source) if isinstance(source, (bytes, bytearray)) else open(source, "rb")
+    wb = load_workbook(fh, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        header = next(
+            ws.iter_rows(
+                min_row=HEADER_ROW, max_row=HEADER_ROW,
+                min_col=FIRST_COL, max_col=LAST_COL, values_only=True,
+            ),
+            (),
+        )
+        names = _column_names(header)
+        width = len(names) - 1
+
+        # Ojo: no usar ws.max_row aquí; en read_only obliga a recorrer toda la
+        # hoja si el archivo no trae <dimension>. Los buffers crecen por bloques.
+        values = np.empty((width, CHUNK_ROWS), dtype="float64")
+        times = []
+        n = 0
+        chunk = []
+
+        def flush():
+            nonlocal values, n
+            if not chunk:
+                return
+            block = _rows_to_array(chunk, width)
+            if n + len(block) > values.shape[1]:
+                grown = np.empty((width, max(2 * values.shape[1], n + len(block))))
+                grown[:, :n] = values[:, :n]
+                values = grown
+            values[:, n:n + len(block)] = block.T
+            n += len(block)
+            chunk.clear()
+
+        for row in ws.iter_rows(
+            min_row=HEADER_ROW + 1, min_col=FIRST_COL, max_col=LAST_COL, values_only=True
+        ):
+            if all(v is None for v in row):
+                continue
+            row = tuple(row) + (None,) * (width + 1 - len(row))
+            times.append(row[0])
+            chunk.append(row[1:width + 1])
+            if len(chunk) >= CHUNK_ROWS:
+                flush()
+        flush()
+    finally:
+        wb.close()
+        fh.close()
+
+    return _build_frame(names, times, values[:, :n])
+
+
+def read_xls(source):
+    import xlrd
+
+    if isinstance(source, (bytes, bytearray)):
+        book = xlrd.open_workbook(file_contents=source, on_demand=True)
+    else:
+        book = xlrd.open_workbook(filename=source, on_demand=True)
+    try:
+        sh = book.sheet_by_index(0)
+        last_col = min(LAST_COL, sh.ncols)
+        header = sh.row_values(HEADER_ROW - 1, FIRST_COL - 1, last_col)
+        names = _column_names([h if h != "" else None for h in header])
+        start = HEADER_ROW
+
+        # Tiempo: las fechas en .xls son números de serie (días) -> vectorizado.
+        # Se convierte celda a celda: una vacía o con texto queda NaT (y se
+        # descarta/ordena como en read_xlsx) sin arrastrar al resto.
+        tcol = FIRST_COL - 1
+        raw_t = sh.col_values(tcol, start_rowx=start) if tcol < sh.ncols else []
+        types = sh.col_types(tcol, start_rowx=start) if tcol < sh.ncols else []
+        n = len(raw_t)
+        is_serial = np.isin(np.asarray(types, dtype="int64"), (xlrd.XL_CELL_DATE, xlrd.XL_CELL_NUMBER))
+        origin = np.datetime64("1904-01-01" if book.datemode else "1899-12-30", "ns")
+        serial = np.asarray(raw_t, dtype=object)[is_serial].astype("float64")
+        times = np.full(n, np.datetime64("NaT"), dtype="datetime64[ns]")
+        times[is_serial] = origin + (serial * 86400e9).round().astype("int64").astype("timedelta64[ns]")
+
+        values = np.full((len(names) - 1, n), np.nan)
+        for j in range(len(names) - 1):
+            colx = FIRST_COL + j
+            if colx >= sh.ncols:
+                continue
+            col = sh.col_values(colx, start_rowx=start, end_rowx=start + n)
+            if not col:
+                continue
+            arr = _rows_to_array([col], len(col))[0]
+            # Celdas de error (#N/A, #DIV/0!) traen un código entero, no un valor
+            col_types = np.asarray(sh.col_types(colx, start_rowx=start, end_rowx=start + n))
+            arr[col_types == xlrd.XL_CELL_ERROR] = np.nan
+            values[j, :len(arr)] = arr
+    finally:
+        book.release_resources()
+
+    return _build_frame(names, times, values)
+
+
+def read_csv(source):
+    # El separador se detecta desde la fila de cabecera (las 6 primeras filas
+    # suelen tener un solo campo)
+    lines = _head(source, 65536).decode("utf-8", errors="ignore").splitlines()
+    sample = "\n".join(lines[HEADER_ROW - 1:])
+    try:
+        sep = csv.Sniffer().sniff(sample, delimiters=",;\t|").delimiter
+    except csv.Error:
+        sep = ","
+    kwargs = dict(
+        sep=sep,
+        skiprows=HEADER_ROW - 1,
+        engine="c",
+        low_memory=False,
+        encoding_errors="replace",
+    )
+    try:
+        # Parser C leyendo solo D–N
+        df = pd.read_csv(
+            _open(source), usecols=range(FIRST_COL - 1, LAST_COL), **kwargs
+        )
+    except ValueError:
+        # Export con menos columnas de las esperadas
+        df = pd.read_csv(_open(source), **kwargs)
+        df = df.iloc[:, FIRST_COL - 1:LAST_COL]
+    times = df.iloc[:, 0].to_numpy()
+    values = np.vstack(
+        [pd.to_numeric(df.iloc[:, j], errors="coerce").to_numpy("float64") for j in range(1, df.shape[1])]
+    ) if df.shape[1] > 1 else np.empty((0, len(df)))
+    return _build_frame([str(c) for c in df.columns], times, values)
+
+
+READERS = {"xlsx": read_xlsx, "xls": read_xls, "csv": read_csv}
+
+
+# -----------------------------
+# Entrada principal
+# -----------------------------
+def ingest_bytes(raw_bytes, filename=None):
+    return ingest(raw_bytes, filename)
+
+
+def ingest_file(path, filename=None):
+    return ingest(path, filename or os.path.basename(path))
+
+
+def ingest(source, filename=None):
+    key = content_key(source)
+    handle = datasets.lookup(key)
+    if handle is not None:
+        print(f"[ingest] {filename}: cache hit ({key})")
+        pyramid.build_async(handle)
+        windows.build_async(handle)
+        return handle
+
+    fmt = detect_format(source, filename)
+    rss_before = _peak_rss_mb()
+    t0 = time.perf_counter()
+    df = READERS[fmt](source)
+    # Datasets siempre ordenados por tiempo (NaT al final): permite cortar
+    # ventanas con búsqueda binaria
+    time_col = df.columns[0]
+    if not df[time_col].is_monotonic_increasing:
+        df = df.sort_values(time_col, kind="stable", na_position="last", ignore_index=True)
+    elapsed = time.perf_counter() - t0
+    rss_after = _peak_rss_mb()
+
+    if rss_after is not None:
+        mem_txt = f"peak RSS {rss_after:.0f} MB (+{rss_after - rss_before:.0f} MB)"
+    else:
+        mem_txt = "peak RSS n/a"
+    print(
+        f"[ingest] {filename}: {fmt}, {_size(source) / 1e6:.1f} MB, "
+        f"{len(df)} rows x {df.shape[1] - 1} tags in {elapsed:.2f}s, {mem_txt}"
+    )
+    handle = datasets.register(df, dataset_id=key)
+    # Niveles de resample e índices de ventanas en segundo plano
+    pyramid.build_async(handle)
+    windows.build_async(handle)
+    return handle
@@ -0,0 +1,33 @@
+# core/jobs.py
+# Ejecución en segundo plano de los callbacks pesados (subida, transformaciones,
+# exportar el reporte). DiskcacheManager lanza cada trabajo en un proceso aparte
+# y guarda progreso y resultados en disco (sin broker): el worker web queda
+# libre y varios workers de gunicorn comparten la misma cola/caché.
+# Los procesos de los trabajos leen/escriben datasets vía core.storage.
+import os
+
+import diskcache
+from dash import DiskcacheManager
+
+from core import ingest, storage
+
+JOBS_DIR = os.path.join(storage.DATA_DIR, "jobs")
+# Tiempo (s) que se conserva un resultado cacheado desde su último uso
+JOB_CACHE_TTL = int(os.environ.get("THICKDATA_JOB_CACHE_TTL", "86400"))
+JOB_CACHE_MB = int(os.environ.get("THICKDATA_JOB_CACHE_MB", "512"))
+
+cache = diskcache.Cache(JOBS_DIR, size_limit=JOB_CACHE_MB * 1024 * 1024)
+
+
+# Entra en la clave de caché de todos los callbacks en segundo plano: si cambia
+# el formato de los datasets, los resultados viejos dejan de reutilizarse
+def _cache_version():
+    return f"ingest-{ingest.INGEST_VERSION}"
+
+
+manager = DiskcacheManager(cache, cache_by=[_cache_version], expire=JOB_CACHE_TTL)
+
+# Sin caché: el resultado se borra al entregarlo. Para callbacks cuyo
+# resultado depende de qué input disparó (no solo de los valores) o que no
+# tiene sentido reutilizar (un archivo con fecha).
+uncached = DiskcacheManager(cache)
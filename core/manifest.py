@@ -0,0 +1,76 @@
+# core/manifest.py
+# Resumen compacto de un dataset, calculado una sola vez al registrarlo
+# (subida o transformación): rango de tiempo, columnas numéricas, filas,
+# intervalo de muestreo y estadísticas por columna. Los callbacks de fechas
+# y de opciones leen de aquí en vez de recorrer los datos.
+import numpy as np
+import pandas as pd
+
+
+def _float(v):
+    v = float(v)
+    return None if np.isnan(v) else v
+
+
+def _column_stats(series):
+    values = pd.Series(series, copy=False).to_numpy(dtype="float64", na_value=np.nan)
+    n_valid = int(np.count_nonzero(~np.isnan(values)))
+    if not n_valid:
+        return {"count": 0, "missing": int(len(values))}
+    return {
+        "count": n_valid,
+        "missing": int(len(values) - n_valid),
+        "min": _float(np.nanmin(values)),
+        "max": _float(np.nanmax(values)),
+        "mean": _float(np.nanmean(values)),
+        "std": _float(np.nanstd(values)),
+    }
+
+
+def build(df):
+    time_col = df.columns[0]
+    times = df[time_col].to_numpy(dtype="datetime64[ns]")
+    valid = times[~np.isnat(times)]
+
+    if len(valid):
+        t_min, t_max = valid.min(), valid.max()
+        start = pd.Timestamp(t_min).isoformat()
+        end = pd.Timestamp(t_max).isoformat()
+    else:
+        start = end = None
+
+    # Intervalo típico entre muestras (mediana, en segundos)
+    if len(valid) > 1:
+        steps = np.diff(np.sort(valid)).astype("timedelta64[ns]").astype("int64")
+        interval = float(np.median(steps)) / 1e9
+    else:
+        interval = None
+
+    numeric = [c for c in df.columns[1:] if pd.api.types.is_numeric_dtype(df[c])]
+    stats = {str(col): _column_stats(df[col]) for col in numeric}
+
+    return {
+        "time_col": str(time_col),
+        "start": start,
+        "end": end,
+        "rows": int(len(df)),
+        "interval_s": interval,
+        "numeric_columns": [str(c) for c in numeric],
+        "stats": stats,
+    }
+
+
+# Manifest de una versión overlay: el de la base + las columnas nuevas o
+# reemplazadas (numéricas), sin recorrer las columnas heredadas
+def extend(summary, columns):
+    out = dict(summary)
+    numeric = list(summary["numeric_columns"])
+    stats = dict(summary["stats"])
+    for name, values in columns.items():
+        name = str(name)
+        if name not in numeric:
+            numeric.append(name)
+        stats[name] = _column_stats(values)
+    out["numeric_columns"] = numeric
+    out["stats"] = stats
+    return out
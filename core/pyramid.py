@@ -0,0 +1,118 @@
+# core/pyramid.py
+# Pirámide de resampleo precalculada (15min ... 7D) por versión de dataset.
+# Cada nivel se construye a partir del anterior acumulando suma y cantidad
+# de muestras por bin, así la media de cada nivel es exacta (igual que
+# resample(rule).mean() sobre los datos crudos). Los niveles se guardan en
+# disco junto al dataset: cambiar el resample en la UI es solo una lectura.
+import os
+import threading
+
+import pandas as pd
+
+from core import datasets, storage
+
+# Mismos valores que el dropdown "time-period"; cada nivel divide al siguiente
+LEVELS = ["15min", "30min", "1H", "4H", "12H", "1D", "7D"]
+
+_lock = threading.Lock()
+_build_locks = {}
+
+
+def _pandas_rule(rule):
+    # pandas 2.2 depreca "H" en favor de "h"
+    return rule.replace("H", "h")
+
+
+def _level_dir(handle, rule):
+    base = storage.dataset_dir(handle["id"], handle["version"])
+    return os.path.join(base, "pyramid", rule)
+
+
+def is_built(handle):
+    return all(
+        os.path.exists(os.path.join(_level_dir(handle, r), storage.META_FILE))
+        for r in LEVELS
+    )
+
+
+def _handle_lock(handle):
+    key = (handle["id"], int(handle["version"]))
+    with _lock:
+        return _build_locks.setdefault(key, threading.Lock())
+
+
+# (regla, medias) de cada nivel; base: columnas numéricas indexadas por tiempo
+def _levels(base):
+    sums = counts = None
+    for rule in LEVELS:
+        freq = _pandas_rule(rule)
+        if sums is None:
+            # Primer nivel: desde los datos crudos
+            sums = base.resample(freq).sum()
+            counts = base.resample(freq).count()
+        else:
+            # Niveles superiores: desde el nivel anterior
+            sums = sums.resample(freq).sum()
+            counts = counts.resample(freq).sum()
+        yield rule, sums / counts.where(counts > 0)
+
+
+def build(handle):
+    with _handle_lock(handle):
+        if is_built(handle):
+            return
+        meta = storage.read_meta(handle["id"], handle["version"])
+        parent = (meta or {}).get("base")
+        if parent is not None:
+            _build_overlay(handle, parent, meta)
+            return
+        df = datasets.get(handle)
+        if df is None or df.empty:
+            return
+        time_col = df.columns[0]
+        num_cols = [
+            c for c in df.columns[1:] if pd.api.types.is_numeric_dtype(df[c])
+        ]
+        base = df.loc[df[time_col].notna(), [time_col] + num_cols].set_index(time_col)
+        for rule, means in _levels(base):
+            storage.write_frame(means.reset_index(), _level_dir(handle, rule))
+
+
+# Versión overlay (core.datasets.register_overlay): los niveles de la base se
+# reutilizan y solo se calculan los de sus columnas propias
+def _build_overlay(handle, parent, meta):
+    build(parent)
+    if not is_built(parent):
+        return
+    own = storage.own_columns(meta)
+    df = datasets.get(handle, columns=own)
+    if df is None or df.empty:
+        return
+    time_col = df.columns[0]
+    own = [c for c in own if pd.api.types.is_numeric_dtype(df[c])]
+    base = df.loc[df[time_col].notna(), [time_col] + own].set_index(time_col)
+    for rule, means in _levels(base):
+        storage.write_overlay(
+            _level_dir(parent, rule),
+            {c: means[c].to_numpy() for c in own},
+            _level_dir(handle, rule),
+        )
+
+
+def build_async(handle):
+    if not datasets.is_handle(handle) or is_built(handle):
+        return
+    threading.Thread(target=build, args=(handle,), daemon=True).start()
+
+
+# Nivel ya resampleado (memory-map, solo las columnas pedidas) o None si
+# la regla no está en la pirámide
+def get_level(handle, rule, columns=None):
+    if rule not in LEVELS or not datasets.is_handle(handle):
+        return None
+    level_dir = _level_dir(handle, rule)
+    df = storage.read_frame(level_dir, columns=columns)
+    if df is None:
+        build(handle)
+        df = storage.read_frame(level_dir, columns=columns)
+    return df
@@ -0,0 +1,84 @@
+# core/render.py
+# Pool persistente de renderers kaleido (Chromium headless) para exportar
+# figuras a imagen. Cada PlotlyScope mantiene su proceso abierto, así solo
+# el primer render de un proceso paga el arranque. El reporte se exporta en
+# un trabajo en segundo plano (core.jobs): el pool vive en ese proceso y
+# muere con él. render_many() reparte un lote de figuras entre los
+# renderers en paralelo.
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import plotly
+
+RENDERERS = int(os.environ.get("THICKDATA_RENDERERS", str(min(4, os.cpu_count() or 1))))
+FORMATS = ("png", "jpeg", "webp", "svg")
+
+# plotly.js local (el de plotly): sin CDN ni MathJax
+_PLOTLYJS = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+
+_lock = threading.Lock()
+_pool = None
+
+
+class _Pool:
+    def __init__(self, size):
+        # Import diferido: kaleido es opcional (sin él se exporta a HTML)
+        from kaleido.scopes.plotly import PlotlyScope
+
+        self.pid = os.getpid()
+        self.free = queue.Queue()
+        for _ in range(size):
+            self.free.put(PlotlyScope(plotlyjs=_PLOTLYJS, mathjax=False))
+        self.executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="kaleido")
+
+    def render(self, fig, fmt, width, height, scale):
+        # Un renderer atiende una figura a la vez
+        scope = self.free.get()
+        try:
+            return scope.transform(fig, format=fmt, width=width, height=height, scale=scale)
+        finally:
+            self.free.put(scope)
+
+
+def _get_pool():
+    global _pool
+    with _lock:
+        # Un proceso hijo (fork) no puede compartir los procesos de Chromium
+        # del padre: arma su propio pool
+        if _pool is None or _pool.pid != os.getpid():
+            _pool = _Pool(max(1, RENDERERS))
+        return _pool
+
+
+def _render_one(pool, fig, fmt, width, height, scale):
+    try:
+        return pool.render(fig, fmt, width, height, scale)
+    except Exception as e:
+        print("Kaleido export failed:", e)
+        return None
+
+
+# Devuelve una lista de bytes (None donde el render falló), en el mismo
+# orden que figs
+def render_many(figs, fmt="png", width=1200, height=650, scale=2):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    figs = list(figs)
+    if not figs:
+        return []
+    try:
+        pool = _get_pool()
+    except Exception as e:
+        print("Kaleido not available:", e)
+        return [None] * len(figs)
+    futures = [
+        pool.executor.submit(_render_one, pool, fig, fmt, width, height, scale)
+        for fig in figs
+    ]
+    return [f.result() for f in futures]
+
+
+def render(fig, fmt="png", width=1200, height=650, scale=2):
+    return render_many([fig], fmt=fmt, width=width, height=height, scale=scale)[0]
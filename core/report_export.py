@@ -0,0 +1,322 @@
+# core/report_export.py
+# Exportación del reporte a archivo (HTML, PDF paginado, ZIP) escribiendo de
+# a un ítem por vez: las imágenes llegan de un iterador y se vuelcan al
+# archivo apenas están, así la memoria no crece con el largo del reporte.
+#
+# entries: iterable de (spec, image_bytes | None) — ver core.reports.
+# spec["table"] opcional: {"columns": [...], "rows": [[...]]} (textos ya
+# formateados), p. ej. las estadísticas por tramo de Before vs After.
+# header: {"title", "generated", "count"}
+import base64
+import csv
+import html
+import io
+import os
+import tempfile
+import zipfile
+
+from core import reports
+
+EXPORT_DIR = os.path.join(reports.REPORTS_DIR, "exports")
+
+KPI_FIELDS = [
+    "below", "within", "above", "pct_in", "pct_time_in", "excursions_below",
+    "excursions_above", "longest_excursion_h", "time_out_h", "mean", "median", "samples",
+]
+
+_CSS = (
+    "body{font-family:Arial,Helvetica,sans-serif;margin:24px;} "
+    "h1{margin:0 0 8px 0;} .meta{color:#666;margin-bottom:20px;} "
+    ".card{border:1px solid #ddd;border-radius:10px;padding:14px;margin:14px 0;} "
+    ".img{width:100%;max-width:1200px;border:1px solid #eee;border-radius:8px;} "
+    ".ttl{font-weight:700;font-size:18px;margin-bottom:4px;} "
+    ".sum{color:#333;margin-top:6px;white-space:pre-line;} "
+    ".tbl{border-collapse:collapse;margin-top:8px;font-size:13px;} "
+    ".tbl th,.tbl td{border:1px solid #ddd;padding:3px 8px;text-align:right;} "
+    ".tbl th{background:#f5f5f5;}"
+)
+
+
+def temp_path(suffix):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=EXPORT_DIR)
+    os.close(fd)
+    return path
+
+
+def _text(value):
+    return "" if value is None else str(value)
+
+
+# -----------------------------
+# HTML
+# -----------------------------
+def _html_head(header, needs_plotly=False):
+    parts = [
+        "<html><head><meta charset='utf-8' /><title>Report</title>",
+        f"<style>{_CSS}</style>",
+    ]
+    if needs_plotly:
+        parts.append("<script src='https://cdn.plot.ly/plotly-latest.min.js'></script>")
+    parts.append("</head><body>")
+    parts.append(f"<h1>{html.escape(header['title'])} — Analysis Report</h1>")
+    parts.append(
+        f"<div class='meta'>Generated: {header['generated']} | Items: {header['count']}</div>"
+    )
+    return "".join(parts)
+
+
+def _html_table(table):
+    head = "".join(f"<th>{html.escape(_text(c))}</th>" for c in table["columns"])
+    body = "".join(
+        "<tr>" + "".join(f"<td>{html.escape(_text(v))}</td>" for v in row) + "</tr>"
+        for row in table["rows"]
+    )
+    return f"<table class='tbl'><tr>{head}</tr>{body}</table>"
+
+
+# src: data URI o ruta relativa de la imagen; fallback_html si no hay imagen
+def _html_card(i, spec, src=None, fallback_html=None):
+    parts = ["<div class='card'>", f"<div class='ttl'>{i}. {html.escape(_text(spec.get('title')))}</div>"]
+    if spec.get("meta"):
+        parts.append(f"<div class='meta'>{html.escape(_text(spec['meta']))}</div>")
+    if src:
+        parts.append(f"<img class='img' src='{src}' />")
+    elif fallback_html:
+        parts.append(fallback_html)
+    if spec.get("summary"):
+        parts.append(f"<div class='sum'>{html.escape(_text(spec['summary']))}</div>")
+    if spec.get("table"):
+        parts.append(_html_table(spec["table"]))
+    parts.append("</div>")
+    return "".join(parts)
+
+
+# fallback(spec) -> HTML interactivo para ítems sin imagen
+def write_html(path, header, entries, fallback=None):
+    with open(path, "w", encoding="utf-8") as fh:
+        # El script de Plotly se incluye siempre: no se sabe de antemano si
+        # algún render va a fallar
+        fh.write(_html_head(header, needs_plotly=fallback is not None))
+        for i, (spec, img) in enumerate(entries, start=1):
+            src = "data:image/png;base64," + base64.b64encode(img).decode("ascii") if img else None
+            alt = fallback(spec) if (img is None and fallback) else None
+            fh.write(_html_card(i, spec, src, alt))
+        fh.write("</body></html>")
+    return path
+
+
+# -----------------------------
+# ZIP (report.html + images/ + kpis.csv + tables/)
+# -----------------------------
+def _kpi_rows(i, spec):
+    kpis = spec.get("kpis")
+    if not kpis:
+        return None
+    row = {"item": i, "title": spec.get("title", ""), "type": spec.get("type", "")}
+    row.update({k: kpis.get(k) for k in KPI_FIELDS})
+    return row
+
+
+def write_zip(path, header, entries, ext="png"):
+    cards = []
+    kpi_rows = []
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for i, (spec, img) in enumerate(entries, start=1):
+            src = None
+            if img:
+                src = f"images/{i:03d}.{ext}"
+                # Las imágenes ya vienen comprimidas
+                zf.writestr(src, img, compress_type=zipfile.ZIP_STORED)
+            cards.append(_html_card(i, spec, src))
+            if spec.get("table"):
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                writer.writerow(spec["table"]["columns"])
+                writer.writerows(spec["table"]["rows"])
+                zf.writestr(f"tables/{i:03d}.csv", buf.getvalue())
+            row = _kpi_rows(i, spec)
+            if row:
+                kpi_rows.append(row)
+
+        zf.writestr("report.html", _html_head(header) + "".join(cards) + "</body></html>")
+
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=["item", "title", "type"] + KPI_FIELDS)
+        writer.writeheader()
+        writer.writerows(kpi_rows)
+        zf.writestr("kpis.csv", buf.getvalue())
+    return path
+
+
+# -----------------------------
+# PDF (A4 apaisado, un ítem por página)
+# -----------------------------
+# Escritor mínimo de PDF: texto en Helvetica y fotos JPEG (DCTDecode). Los
+# objetos se escriben al archivo a medida que llegan; solo se guardan sus
+# offsets para la tabla xref final.
+PAGE_W, PAGE_H = 842, 595
+MARGIN = 36
+
+
+def _pdf_str(text):
+    text = _text(text).replace("→", "->").replace("≥", ">=").replace("≤", "<=").replace("Δ", "d")
+    raw = text.encode("cp1252", errors="replace")
+    raw = raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+    return b"(" + raw + b")"
+
+
+def _wrap(text, size, width):
+    # Ancho medio de Helvetica ~0.5 em
+    max_chars = max(10, int(width / (size * 0.5)))
+    lines = []
+    for para in _text(text).splitlines() or [""]:
+        line = ""
+        for word in para.split(" "):
+            if line and len(line) + 1 + len(word) > max_chars:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        lines.append(line)
+    return lines
+
+
+def _jpeg_size(data):
+    # Recorre los marcadores hasta el SOF (alto y ancho del frame)
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        length = int.from_bytes(data[i + 2:i + 4], "big")
+        if marker in (0xC0, 0xC1, 0xC2):
+            h = int.from_bytes(data[i + 5:i + 7], "big")
+            w = int.from_bytes(data[i + 7:i + 9], "big")
+            return w, h
+        i += 2 + length
+    return None
+
+
+# Tabla como texto en columnas separadas por " | " (Helvetica no es
+# monoespaciada, así que no se intenta alinear). Se corta para dejar lugar
+# al gráfico en la misma página; la tabla completa va en el HTML/ZIP.
+PDF_TABLE_ROWS = 16
+
+
+def _table_lines(table):
+    rows = table["rows"]
+    lines = [" | ".join(_text(v) for v in row) for row in [table["columns"]] + rows[:PDF_TABLE_ROWS]]
+    if len(rows) > PDF_TABLE_ROWS:
+        lines.append(f"... {len(rows) - PDF_TABLE_ROWS} more rows (see HTML/ZIP export)")
+    return lines
+
+
+class _PdfWriter:
+    def __init__(self, fh):
+        self.fh = fh
+        self.offsets = {}
+        self.pages = []
+        self.next_id = 4  # 1: catálogo, 2: árbol de páginas, 3: fuentes
+        fh.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _new_id(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def _write_obj(self, obj_id, body, stream=None):
+        self.offsets[obj_id] = self.fh.tell()
+        self.fh.write(f"{obj_id} 0 obj\n".encode())
+        self.fh.write(body)
+        if stream is not None:
+            self.fh.write(b"\nstream\n")
+            self.fh.write(stream)
+            self.fh.write(b"\nendstream")
+        self.fh.write(b"\nendobj\n")
+
+    # lines: [(texto, tamaño, negrita)] de arriba hacia abajo
+    def add_page(self, lines, image=None):
+        ops = []
+        y = PAGE_H - MARGIN
+        for text, size, bold in lines:
+            for line in _wrap(text, size, PAGE_W - 2 * MARGIN):
+                y -= size * 1.3
+                font = b"/F2" if bold else b"/F1"
+                ops.append(b"BT " + font + f" {size} Tf {MARGIN} {y:.1f} Td ".encode() + _pdf_str(line) + b" Tj ET")
+            y -= 4
+
+        resources = b"/Font 3 0 R"
+        if image:
+            size = _jpeg_size(image)
+            if size:
+                img_id = self._new_id()
+                w, h = size
+                self._write_obj(
+                    img_id,
+                    f"<< /Type /XObject /Subtype /Image /Width {w} /Height {h} "
+                    f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode "
+                    f"/Length {len(image)} >>".encode(),
+                    image,
+                )
+                # Escalar para que entre en lo que queda de página
+                box_w = PAGE_W - 2 * MARGIN
+                box_h = y - MARGIN - 8
+                scale = min(box_w / w, box_h / h)
+                dw, dh = w * scale, h * scale
+                y -= dh + 8
+                ops.append(f"q {dw:.1f} 0 0 {dh:.1f} {MARGIN} {y:.1f} cm /Im1 Do Q".encode())
+                resources += f" /XObject << /Im1 {img_id} 0 R >>".encode()
+
+        content = b"\n".join(ops)
+        content_id = self._new_id()
+        self._write_obj(content_id, f"<< /Length {len(content)} >>".encode(), content)
+        page_id = self._new_id()
+        self._write_obj(
+            page_id,
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 "
+            + f"{PAGE_W} {PAGE_H}".encode()
+            + b"] /Resources << " + resources + b" >> /Contents "
+            + f"{content_id} 0 R >>".encode(),
+        )
+        self.pages.append(page_id)
+
+    def close(self):
+        self._write_obj(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = " ".join(f"{p} 0 R" for p in self.pages)
+        self._write_obj(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode())
+        self._write_obj(
+            3,
+            b"<< /F1 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >> "
+            b"/F2 << /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >> >>",
+        )
+        xref = self.fh.tell()
+        size = self.next_id
+        self.fh.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+        for obj_id in range(1, size):
+            self.fh.write(f"{self.offsets.get(obj_id, 0):010d} 00000 n \n".encode())
+        self.fh.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+
+# entries: imágenes en JPEG
+def write_pdf(path, header, entries):
+    with open(path, "wb") as fh:
+        pdf = _PdfWriter(fh)
+        pdf.add_page([
+            (f"{header['title']} — Analysis Report", 22, True),
+            (f"Generated: {header['generated']} | Items: {header['count']}", 11, False),
+        ])
+        for i, (spec, img) in enumerate(entries, start=1):
+            lines = [(f"{i}. {_text(spec.get('title'))}", 16, True)]
+            if spec.get("meta"):
+                lines.append((spec["meta"], 10, False))
+            if spec.get("summary") and not spec.get("table"):
+                lines.append((spec["summary"], 10, False))
+            if spec.get("table"):
+                lines.extend((line, 8, False) for line in _table_lines(spec["table"]))
+            if not img:
+                lines.append(("(image not available)", 10, False))
+            pdf.add_page(lines, img)
+        pdf.close()
+    return path
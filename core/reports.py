@@ -0,0 +1,99 @@
+# core/reports.py
+# Ítems del reporte guardados en el servidor como specs livianas (JSON):
+# tipo, título, textos, KPIs y la figura en JSON de Plotly. El navegador solo
+# guarda la lista de IDs ("report-items"). Las imágenes se renderizan al
+# imprimir y quedan cacheadas junto al spec (<id>.png).
+import json
+import os
+import re
+import time
+import uuid
+
+from core import storage
+
+REPORTS_DIR = os.path.join(storage.DATA_DIR, "reports")
+# Días que se conserva un ítem sin usarse
+REPORT_TTL_DAYS = float(os.environ.get("THICKDATA_REPORT_TTL_DAYS", "7"))
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def valid_id(item_id):
+    return isinstance(item_id, str) and bool(_ID_RE.match(item_id))
+
+
+def _path(item_id, suffix):
+    return os.path.join(REPORTS_DIR, f"{item_id}{suffix}")
+
+
+def _prune():
+    cutoff = time.time() - REPORT_TTL_DAYS * 86400
+    try:
+        names = os.listdir(REPORTS_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(REPORTS_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+# spec: dict serializable; "figure" puede ser un go.Figure
+def add(spec):
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    _prune()
+    spec = dict(spec)
+    fig = spec.get("figure")
+    if fig is not None and hasattr(fig, "to_json"):
+        # to_json de Plotly sabe serializar numpy/fechas
+        spec["figure"] = json.loads(fig.to_json())
+    item_id = uuid.uuid4().hex
+    tmp = _path(item_id, ".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(spec, fh)
+    os.replace(tmp, _path(item_id, ".json"))
+    return item_id
+
+
+def get(item_id):
+    if not valid_id(item_id):
+        return None
+    path = _path(item_id, ".json")
+    try:
+        with open(path, encoding="utf-8") as fh:
+            spec = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    # Marca de uso (para _prune)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    spec["id"] = item_id
+    return spec
+
+
+# Specs en el orden de ids; los que ya no existen se omiten
+def get_many(item_ids):
+    specs = (get(i) for i in item_ids or [])
+    return [s for s in specs if s is not None]
+
+
+def cached_image(item_id, ext="png"):
+    try:
+        with open(_path(item_id, f".{ext}"), "rb") as fh:
+            return fh.read()
+    except OSError:
+        return None
+
+
+def save_image(item_id, data, ext="png"):
+    if not valid_id(item_id) or not data:
+        return
+    tmp = _path(item_id, f".{ext}.tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, _path(item_id, f".{ext}"))
@@ -0,0 +1,223 @@
+# core/storage.py
+# Formato columnar en disco: un .npy por columna (int64 para el tiempo,
+# float64 para los tags) + meta.json. Las columnas se recargan con
+# memory-map, así leer un tag no trae los demás a RAM.
+import json
+import os
+import re
+import shutil
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.environ.get(
+    "THICKDATA_DATA_DIR", os.path.join(tempfile.gettempdir(), "thickdataweb")
+)
+
+TIME_FILE = "time.npy"
+META_FILE = "meta.json"
+
+# Ids de dataset: uuid4().hex o clave de contenido (core.ingest), 32 hex
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+def valid_id(dataset_id):
+    return isinstance(dataset_id, str) and bool(_ID_RE.match(dataset_id))
+
+
+# El id puede venir de un dcc.Store (editable en el navegador): nunca se une
+# a DATA_DIR sin validar
+def dataset_dir(dataset_id, version):
+    if not valid_id(dataset_id):
+        raise ValueError(f"Invalid dataset id: {dataset_id!r}")
+    return os.path.join(DATA_DIR, dataset_id, f"v{int(version)}")
+
+
+def exists(dataset_id, version):
+    return os.path.exists(os.path.join(dataset_dir(dataset_id, version), META_FILE))
+
+
+def versions(dataset_id):
+    if not valid_id(dataset_id):
+        return []
+    root = os.path.join(DATA_DIR, dataset_id)
+    if not os.path.isdir(root):
+        return []
+    out = []
+    for name in os.listdir(root):
+        if name.startswith("v") and name[1:].isdigit() and exists(dataset_id, name[1:]):
+            out.append(int(name[1:]))
+    return sorted(out)
+
+
+def _column_array(series):
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        return np.ascontiguousarray(series.to_numpy(dtype="float64", na_value=np.nan))
+    # Texto / mixto: se guarda como unicode fijo (también se puede mapear)
+    return np.asarray(series.astype(str).to_numpy(), dtype="U")
+
+
+# -----------------------------
+# Escritura
+# -----------------------------
+# Escribe un frame (tiempo + columnas) en final_dir de forma atómica.
+# Devuelve False si ya existía (lo escribió otro worker).
+def write_frame(df, final_dir, extra=None):
+    if os.path.exists(os.path.join(final_dir, META_FILE)):
+        return False
+
+    time_col = df.columns[0]
+    os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+    # Se escribe en un directorio temporal y se renombra: otro worker nunca ve
+    # un dataset a medio escribir.
+    tmp_dir = f"{final_dir}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp_dir)
+    try:
+        times = pd.to_datetime(df[time_col], errors="coerce").to_numpy(dtype="datetime64[ns]")
+        np.save(os.path.join(tmp_dir, TIME_FILE), times.view("int64"))
+
+        columns = []
+        for i, col in enumerate(df.columns[1:]):
+            arr = _column_array(df[col])
+            fname = f"c{i}.npy"
+            np.save(os.path.join(tmp_dir, fname), arr)
+            columns.append({"name": str(col), "file": fname, "dtype": arr.dtype.str})
+
+        meta = {"time_col": str(time_col), "rows": int(len(df)), "columns": columns}
+        meta.update(extra or {})
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+
+        try:
+            os.rename(tmp_dir, final_dir)
+        except OSError:
+            # Otro proceso lo escribió primero
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return True
+
+
+def save(df, dataset_id, version, extra=None):
+    return write_frame(df, dataset_dir(dataset_id, version), extra=extra)
+
+
+# Versión "overlay" (copy-on-write): solo se escriben las columnas nuevas o
+# reemplazadas; el tiempo y el resto de columnas apuntan (ruta relativa) a los
+# .npy de base_dir, que nunca se modifican. columns: {nombre: array/Series}
+# con el mismo número de filas que la base.
+def write_overlay(base_dir, columns, final_dir, extra=None):
+    if os.path.exists(os.path.join(final_dir, META_FILE)):
+        return False
+    base_meta = _read_json(os.path.join(base_dir, META_FILE))
+    if base_meta is None:
+        raise FileNotFoundError(f"Base dataset not found: {base_dir}")
+
+    def rel(fname):
+        return os.path.relpath(os.path.join(base_dir, fname), final_dir)
+
+    os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+    tmp_dir = f"{final_dir}.tmp-{uuid.uuid4().hex}"
+    os.makedirs(tmp_dir)
+    try:
+        own = {}
+        for i, (name, values) in enumerate(columns.items()):
+            arr = _column_array(pd.Series(values, copy=False))
+            if len(arr) != base_meta["rows"]:
+                raise ValueError(f"Column '{name}' has {len(arr)} rows, expected {base_meta['rows']}.")
+            fname = f"d{i}.npy"
+            np.save(os.path.join(tmp_dir, fname), arr)
+            own[str(name)] = {"name": str(name), "file": fname, "dtype": arr.dtype.str}
+
+        # Mismo orden que la base; las columnas nuevas van al final
+        out = []
+        for col in base_meta["columns"]:
+            out.append(own.pop(col["name"], None) or {**col, "file": rel(col["file"])})
+        out.extend(own.values())
+
+        meta = {
+            "time_col": base_meta["time_col"],
+            "time_file": rel(base_meta.get("time_file", TIME_FILE)),
+            "rows": base_meta["rows"],
+            "columns": out,
+        }
+        meta.update(extra or {})
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh)
+
+        try:
+            os.rename(tmp_dir, final_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return False
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return True
+
+
+def save_overlay(base_id, base_version, columns, dataset_id, version, extra=None):
+    return write_overlay(
+        dataset_dir(base_id, base_version), columns, dataset_dir(dataset_id, version), extra=extra
+    )
+
+
+# Columnas propias de una versión (no heredadas de la base)
+def own_columns(meta):
+    return [c["name"] for c in meta["columns"] if not c["file"].startswith("..")]
+
+
+# -----------------------------
+# Lectura (memory-map)
+# -----------------------------
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def read_frame(base, columns=None):
+    meta = _read_json(os.path.join(base, META_FILE))
+    if meta is None:
+        return None
+
+    wanted = None if columns is None else set(columns)
+    # En un overlay el tiempo (y columnas heredadas) viven en la versión base
+    times = np.load(os.path.join(base, meta.get("time_file", TIME_FILE)), mmap_mode="r")
+    data = {meta["time_col"]: pd.Series(times.view("datetime64[ns]"), copy=False)}
+    for col in meta["columns"]:
+        if wanted is not None and col["name"] not in wanted:
+            continue
+        arr = np.load(os.path.join(base, col["file"]), mmap_mode="r")
+        data[col["name"]] = pd.Series(arr, copy=False)
+    return pd.DataFrame(data, copy=False)
+
+
+def read_meta(dataset_id, version):
+    return _read_json(os.path.join(dataset_dir(dataset_id, version), META_FILE))
+
+
+# Ruta real (normalizada) del .npy de una columna y del tiempo: en un overlay
+# las columnas heredadas apuntan a la versión base. None si no existe.
+def column_paths(dataset_id, version, name):
+    base = dataset_dir(dataset_id, version)
+    meta = _read_json(os.path.join(base, META_FILE))
+    if meta is None:
+        return None
+    for col in meta["columns"]:
+        if col["name"] == name:
+            return (
+                os.path.normpath(os.path.join(base, meta.get("time_file", TIME_FILE))),
+                os.path.normpath(os.path.join(base, col["file"])),
+            )
+    return None
+
+
+def load(dataset_id, version, columns=None):
+    return read_frame(dataset_dir(dataset_id, version), columns=columns)
@@ -0,0 +1,267 @@
+# core/transforms.py
+# Transformaciones de la card "Data Transformation" como un registro de pasos
+# vectorizados: cada paso declara sus columnas de entrada, sus parámetros y
+# la columna que crea. El resultado de cada paso se guarda en disco junto al
+# dataset crudo, con una clave de sus parámetros: si solo cambia la
+# concentración de floculante, %S no se recalcula. El resultado completo
+# (dataset, parámetros, opciones) también se memoiza: re-aplicar lo mismo
+# devuelve la versión ya registrada.
+import hashlib
+import json
+import os
+import uuid
+
+import numpy as np
+
+from core import datasets, formulas, storage
+
+# Sube si cambia alguna fórmula (invalida lo memoizado)
+TRANSFORMS_VERSION = 1
+
+# =========================
+# Columnas esperadas en el Excel
+# =========================
+UNDERFLOW_DENSITY_COL = "Underflow, kg/m3"
+TONNAGE_COL = "Tonnage, tph"
+
+# OJO: cambia estos nombres para que coincidan con tu archivo real
+FLOCC_LMIN_COL = "Flocculant, L/min"
+FLOCC_M3H_COL = "Flocculant, m3/h"
+
+RHO_WATER = 1000.0  # kg/m3
+
+
+# -----------------------------
+# Pasos
+# -----------------------------
+# cols: {columna: array float64}; p: {parámetro: float}
+def _percent_solids(cols, p):
+    rho_s = p["specific_gravity"] * 1000.0
+    ws = (cols[UNDERFLOW_DENSITY_COL] - RHO_WATER) / (rho_s - RHO_WATER)
+    return np.clip(ws * 100.0, 0, 100)
+
+
+def _tph(cols):
+    tph = cols[TONNAGE_COL].copy()
+    tph[tph == 0] = np.nan
+    return tph
+
+
+def _floc_gt_lmin(cols, p):
+    return cols[FLOCC_LMIN_COL] * p["flocc_strength"] * 10 * 60.0 / _tph(cols)
+
+
+def _floc_gt_m3h(cols, p):
+    # m3/h → L/min (·1000/60) y misma lógica g/t
+    return cols[FLOCC_M3H_COL] * (1000.0 / 60.0) * 10 * p["flocc_strength"] * 60.0 / _tph(cols)
+
+
+# Validación de parámetros: (regla, mensaje si no se cumple)
+PARAMS = {
+    "specific_gravity": (
+        lambda v: v is not None and v > 1,
+        "❌ Please enter a valid Solid Specific Gravity (>1).",
+    ),
+    "flocc_strength": (
+        lambda v: v is not None and v > 0,
+        "❌ Please enter a valid Flocculant Strength (g/L).",
+    ),
+}
+
+# En orden de aplicación; si dos pasos crean la misma columna, gana el último
+STEPS = [
+    {
+        "name": "density_to_percent_s",
+        "output": "Underflow_%S",
+        "inputs": [UNDERFLOW_DENSITY_COL],
+        "params": ["specific_gravity"],
+        "compute": _percent_solids,
+        "done": "✅ Created column 'Underflow_%S' from density.",
+        "error": "❌ Error converting density to % solids.",
+    },
+    {
+        "name": "flocc_to_gt",
+        "output": "Floc_Dosage_g/t",
+        "inputs": [FLOCC_LMIN_COL, TONNAGE_COL],
+        "params": ["flocc_strength"],
+        "compute": _floc_gt_lmin,
+        "done": "✅ Created column 'Floc_Dosage_g/t' from L/min.",
+        "error": "❌ Error converting flocculant L/min to g/t.",
+    },
+    {
+        "name": "flocc_to_gt_m3h",
+        "output": "Floc_Dosage_g/t",
+        "inputs": [FLOCC_M3H_COL, TONNAGE_COL],
+        "params": ["flocc_strength"],
+        "compute": _floc_gt_m3h,
+        "done": "✅ Created/updated column 'Floc_Dosage_g/t' from m3/h.",
+        "error": "❌ Error converting flocculant m3/h to g/t.",
+    },
+]
+
+
+# -----------------------------
+# Memo en disco (compartido entre workers y procesos de trabajos)
+# -----------------------------
+def _digest(obj):
+    raw = json.dumps(obj, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+def _memo_dir(handle):
+    return os.path.join(storage.dataset_dir(handle["id"], handle["version"]), "derived")
+
+
+def _step_path(handle, step, params):
+    key = _digest([TRANSFORMS_VERSION, step["name"], {k: params[k] for k in step["params"]}])
+    return os.path.join(_memo_dir(handle), f"{step['name']}-{key}.npy")
+
+
+def _result_path(handle, options, params, formula_lines):
+    key = _digest([TRANSFORMS_VERSION, sorted(options), params, formula_lines])
+    return os.path.join(_memo_dir(handle), f"result-{key}.json")
+
+
+def _save_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as fh:
+        write(fh)
+    os.replace(tmp, path)
+
+
+def _cached_result(path):
+    try:
+        with open(path, encoding="utf-8") as fh:
+            res = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    handle = datasets.lookup(res["id"], res["version"])
+    if handle is None:
+        return None
+    return handle, res["messages"]
+
+
+def _memoized(path, compute):
+    try:
+        return np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        pass
+    values = np.asarray(compute(), dtype="float64")
+    _save_atomic(path, lambda fh: np.save(fh, values))
+    return values
+
+
+def _run_step(handle, df, step, params):
+    def compute():
+        cols = {c: df[c].to_numpy(dtype="float64", na_value=np.nan) for c in step["inputs"]}
+        return step["compute"](cols, params)
+
+    return _memoized(_step_path(handle, step, params), compute)
+
+
+# Fórmula del usuario (core.formulas). La clave incluye la expresión y de
+# dónde salen las columnas derivadas que usa (sources: columna -> clave).
+def _run_formula(handle, df, derived, sources, expr):
+    refs, _ = formulas.compile_expr(expr)
+    missing = [r for r in refs if r not in derived and r not in df.columns]
+    if missing:
+        raise formulas.FormulaError(f"Unknown tag [{missing[0]}].")
+    key = _digest([TRANSFORMS_VERSION, "formula", expr, {r: sources.get(r) for r in refs}])
+    path = os.path.join(_memo_dir(handle), f"formula-{key}.npy")
+
+    def compute():
+        cols = {
+            r: np.asarray(derived[r]) if r in derived
+            else df[r].to_numpy(dtype="float64", na_value=np.nan)
+            for r in refs
+        }
+        return formulas.evaluate(expr, cols, len(df))
+
+    return _memoized(path, compute), key
+
+
+# -----------------------------
+# Aplicar
+# -----------------------------
+# handle: dataset crudo. formula_text: fórmulas del usuario, una por línea
+# ("Nombre = expresión", ver core.formulas). progress(value, label) opcional.
+# Devuelve (handle, mensajes) o None si el dataset ya no existe.
+def apply(handle, options, params, formula_text=None, progress=None):
+    if not datasets.is_handle(handle):
+        return None
+    options = [o for o in (options or []) if o in {s["name"] for s in STEPS}]
+    params = {k: (None if v is None else float(v)) for k, v in params.items()}
+    try:
+        formula_lines = formulas.parse_text(formula_text)
+        formula_error = None
+    except formulas.FormulaError as e:
+        formula_lines = []
+        formula_error = str(e)
+
+    result_path = _result_path(handle, options, params, formula_lines)
+    cached = _cached_result(result_path)
+    if cached is not None:
+        return cached
+
+    df = datasets.get(handle)
+    if df is None:
+        return None
+
+    derived = {}
+    sources = {}   # columna derivada -> clave de su memo
+    messages = []
+    steps = [s for s in STEPS if s["name"] in options]
+    for n, step in enumerate(steps):
+        if progress:
+            progress(10 + int(60 * n / len(steps)), f"Applying {step['output']}…")
+        missing = [c for c in step["inputs"] if c not in df.columns]
+        if missing:
+            messages.append(f"❌ Column '{missing[0]}' not found in data.")
+            continue
+        invalid = [PARAMS[k][1] for k in step["params"] if not PARAMS[k][0](params.get(k))]
+        if invalid:
+            messages.append(invalid[0])
+            continue
+        try:
+            derived[step["output"]] = _run_step(handle, df, step, params)
+            sources[step["output"]] = os.path.basename(_step_path(handle, step, params))
+            messages.append(step["done"])
+        except Exception as e:
+            print(f"Error in transformation {step['name']}:", e)
+            messages.append(step["error"])
+
+    # Fórmulas del usuario, en orden: pueden usar columnas derivadas y
+    # fórmulas anteriores
+    if formula_error:
+        messages.append(f"❌ {formula_error}")
+    if formula_lines and progress:
+        progress(60, "Evaluating formulas…")
+    for lineno, name, expr in formula_lines:
+        if name == df.columns[0]:
+            messages.append(f"❌ Formula line {lineno}: '{name}' is the time column.")
+            continue
+        try:
+            derived[name], sources[name] = _run_formula(handle, df, derived, sources, expr)
+            messages.append(f"✅ Created column '{name}' from formula.")
+        except formulas.FormulaError as e:
+            messages.append(f"❌ Formula line {lineno} ('{name}'): {e}")
+
+    if not messages:
+        messages.append("ℹ️ No transformation selected or nothing was applied.")
+
+    if not derived:
+        # Nada que agregar: los datos crudos sirven tal cual
+        out = datasets.make_handle(handle["id"], handle["version"])
+    else:
+        if progress:
+            progress(70, "Saving dataset…")
+        # Overlay: solo se escriben las columnas derivadas, las crudas se
+        # comparten con la versión base
+        out = datasets.register_overlay(handle, derived)
+
+    _save_atomic(
+        result_path,
+        lambda fh: fh.write(json.dumps({**out, "messages": messages}).encode("utf-8")),
+    )
+    return out, messages
@@ -0,0 +1,234 @@
+# core/uploads.py
+# Subida por chunks (reanudable) sin pasar por dcc.Upload/base64.
+# El navegador (assets/chunked_upload.js) envía el archivo en trozos a
+# /upload/<upload_id>; aquí se escriben en un archivo temporal y, al llegar
+# el último byte, se parsea en un proceso aparte (el worker web queda libre,
+# como con los trabajos de core.jobs). El proceso deja su pid en <token>.pid:
+# si muere sin dejar resultado (worker reciclado, OOM), poll() lo detecta.
+# El callback de Dash solo recibe el upload_id (token) y pregunta por el
+# handle del dataset.
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+import psutil
+
+from core import ingest, pyramid, storage, windows
+
+UPLOAD_DIR = os.path.join(storage.DATA_DIR, "uploads")
+MAX_UPLOAD_BYTES = int(os.environ.get("THICKDATA_MAX_UPLOAD_MB", "1024")) * 1024 * 1024
+STREAM_BLOCK = 1 << 20
+# Archivos de subidas abandonadas (o resultados no recogidos) se borran
+# pasado este tiempo sin cambios
+UPLOAD_TTL_HOURS = float(os.environ.get("THICKDATA_UPLOAD_TTL_HOURS", "24"))
+# Sin <token>.pid tras este tiempo, el .bin no tiene dueño
+_START_GRACE_S = 60
+
+_TOKEN_RE = re.compile(r"^[0-9a-f]{16,64}$")
+_lock = threading.Lock()
+_token_locks = {}   # token -> Lock (un chunk a la vez por subida)
+
+
+class UploadError(Exception):
+    pass
+
+
+def valid_token(token):
+    return isinstance(token, str) and bool(_TOKEN_RE.match(token))
+
+
+def _path(token, suffix):
+    return os.path.join(UPLOAD_DIR, f"{token}{suffix}")
+
+
+def _token_lock(token):
+    with _lock:
+        return _token_locks.setdefault(token, threading.Lock())
+
+
+def is_complete(token):
+    return os.path.exists(_path(token, ".bin")) or os.path.exists(_path(token, ".json"))
+
+
+def _prune():
+    cutoff = time.time() - UPLOAD_TTL_HOURS * 3600
+    try:
+        names = os.listdir(UPLOAD_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(UPLOAD_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+    # Locks de subidas que ya no están en curso en este proceso
+    with _lock:
+        for token in list(_token_locks):
+            if not os.path.exists(_path(token, ".part")) and not _token_locks[token].locked():
+                del _token_locks[token]
+
+
+def received(token):
+    for suffix in (".bin", ".part"):
+        try:
+            return os.path.getsize(_path(token, suffix))
+        except OSError:
+            continue
+    return 0
+
+
+# -----------------------------
+# Recepción de chunks
+# -----------------------------
+# stream: objeto tipo archivo (request.stream) con los bytes del chunk.
+# Devuelve el número de bytes recibidos en total (para reanudar).
+def write_chunk(token, offset, total, stream, filename=None):
+    if not valid_token(token):
+        raise UploadError("Invalid upload id.")
+    if total < 0 or total > MAX_UPLOAD_BYTES:
+        raise UploadError("File too large.")
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    with _token_lock(token):
+        if is_complete(token):
+            return total
+        part = _path(token, ".part")
+        current = os.path.getsize(part) if os.path.exists(part) else 0
+        # Solo se acepta el siguiente trozo contiguo; si no, el cliente
+        # reanuda desde "current"
+        if offset != current:
+            return current
+
+        if offset == 0:
+            _prune()
+            if filename:
+                with open(_path(token, ".name"), "w", encoding="utf-8") as fh:
+                    fh.write(filename)
+
+        with open(part, "ab") as fh:
+            written = 0
+            for block in iter(lambda: stream.read(STREAM_BLOCK), b""):
+                written += len(block)
+                if offset + written > total:
+                    raise UploadError("Chunk exceeds declared size.")
+                fh.write(block)
+        current = offset + written
+
+        if current == total:
+            os.replace(part, _path(token, ".bin"))
+            _start_parse(token)
+    if current == total:
+        with _lock:
+            _token_locks.pop(token, None)
+    return current
+
+
+def _filename(token):
+    try:
+        with open(_path(token, ".name"), encoding="utf-8") as fh:
+            return fh.read()
+    except OSError:
+        return None
+
+
+# -----------------------------
+# Parseo
+# -----------------------------
+def _start_parse(token):
+    proc = multiprocessing.Process(target=_parse, args=(token,))
+    proc.start()
+    owner = {"pid": proc.pid, "created": psutil.Process(proc.pid).create_time()}
+    # Si ya terminó (archivo chico), no queda un .pid suelto
+    if os.path.exists(_path(token, ".bin")):
+        with open(_path(token, ".pid"), "w", encoding="utf-8") as fh:
+            json.dump(owner, fh)
+    # Solo para recoger el proceso al terminar (sin zombies)
+    threading.Thread(target=proc.join, daemon=True).start()
+
+
+def _write_result(token, result):
+    tmp = _path(token, ".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(result, fh)
+    os.replace(tmp, _path(token, ".json"))
+    # El archivo ya está en el dataset cache; el binario sobra
+    for suffix in (".bin", ".name", ".pid"):
+        try:
+            os.remove(_path(token, suffix))
+        except OSError:
+            pass
+
+
+def _parse(token):
+    try:
+        handle = ingest.ingest_file(_path(token, ".bin"), _filename(token))
+        # El proceso termina al devolver: la pirámide y los índices se
+        # completan aquí y no en un hilo
+        pyramid.build(handle)
+        windows.build(handle)
+        result = {"handle": handle}
+    except Exception as e:
+        print("Error al leer el archivo:", e)
+        result = {"error": str(e)}
+    _write_result(token, result)
+
+
+def _read_result(token):
+    try:
+        with open(_path(token, ".json"), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+# ¿Sigue vivo el proceso que parsea token? (puede ser de otro worker)
+def _owner_alive(token):
+    try:
+        with open(_path(token, ".pid"), encoding="utf-8") as fh:
+            owner = json.load(fh)
+    except (OSError, ValueError):
+        # Recién renombrado a .bin, el pid todavía no se escribió
+        try:
+            return time.time() - os.path.getmtime(_path(token, ".bin")) < _START_GRACE_S
+        except OSError:
+            return False
+    try:
+        proc = psutil.Process(owner["pid"])
+        # Mismo pid pero otro proceso (pid reutilizado) = dueño muerto
+        same = abs(proc.create_time() - owner["created"]) < 1.0
+        return same and proc.status() != psutil.STATUS_ZOMBIE
+    except psutil.Error:
+        return False
+
+
+# Estado del parseo (puede estar ocurriendo en otro worker), sin esperar:
+# el handle del dataset si ya terminó, None si sigue en curso. El callback
+# de Dash vuelve a preguntar con un dcc.Interval.
+def poll(token):
+    if not valid_token(token):
+        raise UploadError("Invalid upload id.")
+    res = _read_result(token)
+    if res is None:
+        if os.path.exists(_path(token, ".bin")):
+            if _owner_alive(token):
+                return None
+            # Puede que el parseo haya terminado justo ahora
+            res = _read_result(token)
+            if res is None:
+                res = {"error": "File processing was interrupted. Please upload the file again."}
+                _write_result(token, res)
+        elif os.path.exists(_path(token, ".part")):
+            return None
+        else:
+            # Puede que el parseo haya terminado justo ahora
+            res = _read_result(token)
+            if res is None:
+                raise UploadError("Upload not found.")
+    if "error" in res:
+        raise UploadError(res["error"])
+    return res["handle"]
@@ -0,0 +1,281 @@
+# core/windows.py
+# Índice de ventanas por columna para consultas de Target compliance.
+# El tiempo del dataset ya está ordenado (NaT al final), así que una ventana
+# [inicio, fin) son dos búsquedas binarias. Con sumas acumuladas de cantidad,
+# suma y suma de cuadrados, n/media/desvío de cualquier ventana salen de dos
+# lecturas. Los conteos por umbral (bajo/sobre la banda) usan los valores de
+# cada bloque de SKETCH_BLOCK filas ya ordenados: búsqueda binaria en los
+# bloques completos de la ventana y conteo exacto en los dos bordes, sin
+# recorrer la columna para cada (low, high).
+#
+# Percentiles: cada bloque de SKETCH_BLOCK filas guarda SKETCH_POINTS
+# cuantiles (niveles (k + 0.5) / K) y su cantidad de muestras. Una ventana se
+# responde combinando los bloques completos que cubre (cada punto pesa
+# cantidad / K) con los valores exactos de los bordes. Error: el rango del
+# percentil estimado difiere del real en a lo sumo 1/K de las muestras de la
+# ventana (~0.8 % con K = 128). Ventanas de hasta EXACT_QUANTILE_ROWS filas
+# se calculan exactas.
+#
+# Todo se guarda junto al .npy de la columna (windows/), así un overlay
+# reutiliza el índice de las columnas que hereda de la base.
+import json
+import os
+import threading
+import uuid
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from core import datasets, storage
+
+SKETCH_BLOCK = 4096
+SKETCH_POINTS = 128
+EXACT_QUANTILE_ROWS = int(os.environ.get("THICKDATA_EXACT_QUANTILE_ROWS", "100000"))
+
+_NAT = np.iinfo("int64").min
+
+_lock = threading.Lock()
+_build_locks = {}
+
+
+def _index_paths(column_path):
+    folder = os.path.join(os.path.dirname(column_path), "windows")
+    stem = os.path.splitext(os.path.basename(column_path))[0]
+    return (
+        os.path.join(folder, f"{stem}.npy"),
+        os.path.join(folder, f"{stem}-sketch.npy"),
+        os.path.join(folder, f"{stem}-sorted.npy"),
+        os.path.join(folder, f"{stem}.json"),
+    )
+
+
+def _path_lock(column_path):
+    with _lock:
+        return _build_locks.setdefault(column_path, threading.Lock())
+
+
+# Nombre temporal único: otro hilo o proceso puede estar escribiendo el mismo
+# índice a la vez
+def _save_atomic(path, write):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "wb") as fh:
+        write(fh)
+    os.replace(tmp, path)
+
+
+# (bloques, SKETCH_BLOCK): valores de cada bloque ordenados; NaN (y el
+# relleno del último bloque) quedan al final
+def _sorted_blocks(v):
+    n_blocks = -(-len(v) // SKETCH_BLOCK)
+    blocks = np.full(n_blocks * SKETCH_BLOCK, np.nan)
+    blocks[:len(v)] = v
+    return np.sort(blocks.reshape(n_blocks, SKETCH_BLOCK), axis=1)
+
+
+# (bloques, 1 + K): cantidad de muestras válidas y K cuantiles de cada bloque
+def _sketch(ordered):
+    n_blocks = len(ordered)
+    counts = np.count_nonzero(~np.isnan(ordered), axis=1)
+    levels = (np.arange(SKETCH_POINTS) + 0.5) / SKETCH_POINTS
+    pos = levels[None, :] * np.maximum(counts - 1, 0)[:, None]
+    lo = np.floor(pos).astype("int64")
+    hi = np.minimum(lo + 1, np.maximum(counts - 1, 0)[:, None])
+    v_lo = np.take_along_axis(ordered, lo, axis=1)
+    v_hi = np.take_along_axis(ordered, hi, axis=1)
+    out = np.empty((n_blocks, SKETCH_POINTS + 1))
+    out[:, 0] = counts
+    out[:, 1:] = v_lo + (v_hi - v_lo) * (pos - lo)
+    return out
+
+
+def _build(time_path, column_path):
+    prefix_path, sketch_path, sorted_path, info_path = _index_paths(column_path)
+    times = np.load(time_path, mmap_mode="r")
+    values = np.load(column_path, mmap_mode="r")
+    n = len(times) - int(np.count_nonzero(times == _NAT))
+    v = np.asarray(values[:n], dtype="float64")
+    valid = ~np.isnan(v)
+    # Se acumula centrado en la media: la varianza por ventana (E[x²] - E[x]²)
+    # no pierde precisión con valores grandes
+    shift = float(v[valid].mean()) if valid.any() else 0.0
+    x = np.where(valid, v - shift, 0.0)
+    prefix = np.zeros((3, n + 1), dtype="float64")
+    np.cumsum(valid, out=prefix[0, 1:])
+    np.cumsum(x, out=prefix[1, 1:])
+    np.cumsum(x * x, out=prefix[2, 1:])
+
+    os.makedirs(os.path.dirname(prefix_path), exist_ok=True)
+    _save_atomic(prefix_path, lambda fh: np.save(fh, prefix))
+    ordered = _sorted_blocks(v)
+    _save_atomic(sorted_path, lambda fh: np.save(fh, ordered))
+    _save_atomic(sketch_path, lambda fh: np.save(fh, _sketch(ordered)))
+    # El .json va último: si existe, el índice está completo
+    info = json.dumps({"rows": n, "shift": shift}).encode("utf-8")
+    _save_atomic(info_path, lambda fh: fh.write(info))
+
+
+@lru_cache(maxsize=64)
+def _load(time_path, column_path):
+    prefix_path, sketch_path, sorted_path, info_path = _index_paths(column_path)
+    # Un build por columna a la vez (ingest lo lanza en segundo plano mientras
+    # los callbacks ya piden el índice)
+    with _path_lock(column_path):
+        if not all(os.path.exists(p) for p in (info_path, sketch_path, sorted_path)):
+            _build(time_path, column_path)
+    with open(info_path, encoding="utf-8") as fh:
+        info = json.load(fh)
+    n = info["rows"]
+    return {
+        "time": np.load(time_path, mmap_mode="r")[:n],
+        "values": np.load(column_path, mmap_mode="r")[:n],
+        "prefix": np.load(prefix_path, mmap_mode="r"),
+        "sketch": np.load(sketch_path, mmap_mode="r"),
+        "sorted": np.load(sorted_path, mmap_mode="r"),
+        "shift": info["shift"],
+    }
+
+
+# Índice de una columna numérica del dataset (se construye la primera vez)
+def get(handle, column):
+    if not datasets.is_handle(handle):
+        return None
+    paths = storage.column_paths(handle["id"], handle["version"], column)
+    if paths is None:
+        return None
+    return _load(*paths)
+
+
+# Índices de todas las columnas numéricas (al registrar una versión; en un
+# overlay solo se construyen los de sus columnas propias)
+def build(handle):
+    summary = datasets.manifest(handle)
+    if not summary:
+        return
+    for col in summary["numeric_columns"]:
+        get(handle, col)
+
+
+def build_async(handle):
+    if not datasets.is_handle(handle):
+        return
+    threading.Thread(target=build, args=(handle,), daemon=True).start()
+
+
+# Filas [i, j) con inicio <= t < fin
+def bounds(idx, start, end):
+    lo = pd.Timestamp(start).value
+    hi = pd.Timestamp(end).value
+    i, j = np.searchsorted(idx["time"], [lo, hi], side="left")
+    return int(i), int(j)
+
+
+def moments(idx, i, j):
+    p = idx["prefix"]
+    count = int(p[0, j] - p[0, i])
+    if count == 0:
+        return {"rows": j - i, "count": 0, "mean": float("nan"), "std": float("nan")}
+    s = (p[1, j] - p[1, i]) / count
+    var = max((p[2, j] - p[2, i]) / count - s * s, 0.0)
+    return {"rows": j - i, "count": count, "mean": float(s + idx["shift"]), "std": float(np.sqrt(var))}
+
+
+# Filas de cada bloque de `blocks` (índices) con v < x (strict) o v <= x:
+# bisección vectorizada sobre los bloques ordenados, log2(SKETCH_BLOCK) pasos.
+# NaN nunca cumple, y quedan al final del bloque.
+def _block_ranks(idx, blocks, x, strict):
+    ordered = idx["sorted"]
+    lo = np.zeros(len(blocks), dtype="int64")
+    hi = np.full(len(blocks), SKETCH_BLOCK, dtype="int64")
+    while True:
+        active = lo < hi
+        if not active.any():
+            return lo
+        mid = np.minimum((lo + hi) // 2, SKETCH_BLOCK - 1)
+        v = ordered[blocks, mid]
+        ok = active & ((v < x) if strict else (v <= x))
+        lo = np.where(ok, mid + 1, lo)
+        hi = np.where(active & ~ok, mid, hi)
+
+
+# Filas [0, e) con v < x (o v <= x) para cada borde e (creciente): bloques
+# completos por búsqueda binaria + conteo exacto del bloque parcial
+def _rank_prefix(idx, edges, x, strict):
+    b_edges = edges // SKETCH_BLOCK
+    b0, b1 = int(b_edges[0]), int(b_edges[-1])
+    ranks = _block_ranks(idx, np.arange(b0, b1), x, strict)
+    cum = np.concatenate(([0], np.cumsum(ranks)))
+    out = cum[b_edges - b0]
+    for k, e in enumerate(edges):
+        part = np.asarray(idx["values"][b_edges[k] * SKETCH_BLOCK:e])
+        out[k] += int(np.count_nonzero((part < x) if strict else (part <= x)))
+    return out
+
+
+# Como moments, para los tramos entre bordes consecutivos de edges (índices
+# de fila crecientes) de una vez: arrays "count", "mean", "std"
+def segment_moments(idx, edges):
+    d = np.diff(idx["prefix"][:, np.asarray(edges, dtype="int64")], axis=1)
+    count = d[0]
+    has = count > 0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        s = d[1] / count
+        var = np.maximum(d[2] / count - s * s, 0.0)
+    return {
+        "count": count.astype("int64"),
+        "mean": np.where(has, s + idx["shift"], np.nan),
+        "std": np.where(has, np.sqrt(var), np.nan),
+    }
+
+
+# Arrays (debajo, dentro, encima) de [low, high] entre bordes consecutivos
+# de edges (índices de fila crecientes, p. ej. inicio de cada día); NaN no
+# cuenta
+def band_counts(idx, edges, low, high):
+    edges = np.asarray(edges, dtype="int64")
+    below = np.diff(_rank_prefix(idx, edges, float(low), True))
+    not_above = np.diff(_rank_prefix(idx, edges, float(high), False))
+    count = np.diff(idx["prefix"][0, edges]).astype("int64")
+    return below, not_above - below, count - not_above
+
+
+# (debajo, dentro, encima) en las filas [i, j)
+def threshold_counts(idx, i, j, low, high):
+    below, within, above = band_counts(idx, [i, j], low, high)
+    return int(below[0]), int(within[0]), int(above[0])
+
+
+# Percentiles (0-100) de las filas [i, j), ignorando NaN. exact=None:
+# exactos si la ventana tiene hasta EXACT_QUANTILE_ROWS filas, si no desde
+# los bloques (error de rango <= 1/SKETCH_POINTS, ver arriba).
+def quantiles(idx, i, j, qs, exact=None):
+    qs = np.asarray(qs, dtype="float64")
+    if exact is None:
+        exact = j - i <= EXACT_QUANTILE_ROWS
+    b_lo = -(-i // SKETCH_BLOCK)
+    b_hi = j // SKETCH_BLOCK
+    if exact or b_hi <= b_lo:
+        values = np.asarray(idx["values"][i:j])
+        if not np.any(~np.isnan(values)):
+            return np.full(len(qs), np.nan)
+        return np.nanpercentile(values, qs)
+
+    # Bordes exactos (peso 1) + puntos de los bloques completos (peso n / K)
+    edges = np.concatenate((
+        idx["values"][i:b_lo * SKETCH_BLOCK], idx["values"][b_hi * SKETCH_BLOCK:j]
+    ))
+    edges = edges[~np.isnan(edges)]
+    blocks = idx["sketch"][b_lo:b_hi]
+    blocks = blocks[blocks[:, 0] > 0]
+    points = blocks[:, 1:].ravel()
+    weights = np.repeat(blocks[:, 0] / SKETCH_POINTS, SKETCH_POINTS)
+
+    values = np.concatenate((edges, points))
+    weights = np.concatenate((np.ones(len(edges)), weights))
+    if not len(values):
+        return np.full(len(qs), np.nan)
+    order = np.argsort(values, kind="stable")
+    values, weights = values[order], weights[order]
+    # Cada punto se ubica en el centro de su peso acumulado
+    centers = np.cumsum(weights) - weights / 2
+    return np.interp(qs / 100.0 * weights.sum(), centers, values)
@@ -1,12 +1,13 @@
 from dash import dcc, html
 from dash.dependencies import Input, Output, State
 import dash_bootstrap_components as dbc
-import pandas as pd
-import io
 import base64
 import dash  # para callback_context
-from dash import Dash
-import numpy as np  # <-- NUEVO
+from dash import Dash, no_update
+from flask import jsonify, request
+from urllib.parse import unquote
+
+from core import datasets, formulas, ingest, jobs, pyramid, transforms, uploads, windows
 
 # =========================
 # Crear la aplicación Dash
@@ -16,21 +17,46 @@ app = Dash(
     external_stylesheets=[dbc.themes.BOOTSTRAP],
     suppress_callback_exceptions=True,
     use_pages=True,  # por si en plots.py sigues usando dash.register_page
+    # Callbacks pesados (background=True) corren en procesos aparte (core.jobs)
+    background_callback_manager=jobs.manager,
 )
 server = app.server
 
 # Importar la subpágina de análisis DESPUÉS de crear la app
 from pages import plots  # noqa: E402
 
+# Barras de progreso de los callbacks en segundo plano
+PROGRESS_SHOWN = {"height": "16px", "marginTop": "8px"}
+PROGRESS_HIDDEN = {"display": "none"}
+
+# Subida por chunks: cada cuánto se pregunta si terminó el parseo y cuánto
+# se espera como máximo
+UPLOAD_POLL_MS = 1000
+UPLOAD_TIMEOUT_S = 600
+
+# =========================
+# Subida por chunks (assets/chunked_upload.js)
 # =========================
-# Columnas esperadas en el Excel
-# ========================= 
-UNDERFLOW_DENSITY_COL = "Underflow, kg/m3"
-TONNAGE_COL = "Tonnage, tph"
+# El navegador manda el archivo en trozos como bytes crudos (sin base64) y
+# el callback de Dash solo recibe el token de la subida en "upload-token".
+@server.route("/upload/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    if not uploads.valid_token(upload_id):
+        return jsonify(error="Invalid upload id."), 400
+    return jsonify(received=uploads.received(upload_id), complete=uploads.is_complete(upload_id))
+
+
+@server.route("/upload/<upload_id>", methods=["POST"])
+def upload_chunk(upload_id):
+    try:
+        offset = int(request.headers.get("X-Upload-Offset", "0"))
+        total = int(request.headers.get("X-Upload-Total", "-1"))
+        filename = unquote(request.headers.get("X-Upload-Filename", ""))
+        received = uploads.write_chunk(upload_id, offset, total, request.stream, filename)
+    except (ValueError, uploads.UploadError) as e:
+        return jsonify(error=str(e)), 400
+    return jsonify(received=received, complete=received == total)
 
-# OJO: cambia estos nombres para que coincidan con tu archivo real
-FLOCC_LMIN_COL = "Flocculant, L/min"
-FLOCC_M3H_COL = "Flocculant, m3/h"
 
 # =========================
 # Layout principal
@@ -65,9 +91,12 @@ app.layout = html.Div(
         html.Div(id="page-content", style={"flex": "1"}),
 
         # Stores
-        # Para data pesada, usar "memory" (por defecto) para evitar exceder la cuota del navegador
+        # Solo guardan un handle {"id", "version"}; los DataFrames viven en el servidor (core.datasets)
         dcc.Store(id="raw-data"),              # storage_type="memory" por defecto
         dcc.Store(id="stored-data"),           # idem
+        dcc.Store(id="upload-token"),          # {"token", "filename"} de la subida por chunks
+        dcc.Interval(id="upload-poll", interval=UPLOAD_POLL_MS, disabled=True),
+        dcc.Store(id="transform-history"),     # {"stack": [handles], "pos"} para undo/redo
         # Esta sí puede ser "session" porque es texto pequeño
         dcc.Store(id="project-name-store", storage_type="session"),
         # Footer
@@ -269,6 +298,7 @@ def display_page(pathname):
                                             "backgroundColor": "#f9f9f9",
                                         },
                                         multiple=False,
+                                        accept=".xlsx,.xlsm,.xls,.csv",
                                     ),
                                     html.Button(
                                         "×",
@@ -291,6 +321,13 @@ def display_page(pathname):
                                         },
                                     ),
                                     html.Div(id="output-file-upload"),
+                                    dbc.Progress(
+                                        id="upload-progress",
+                                        value=0,
+                                        striped=True,
+                                        animated=True,
+                                        style=PROGRESS_HIDDEN,
+                                    ),
                                 ],
                             ),
                          
@@ -351,6 +388,20 @@ def display_page(pathname):
                                     inputStyle={"marginRight": "8px"},
                                     className="checkbox-list",
                                 ),
+                                html.Div(
+                                    "Formula columns (one per line, tags in [brackets]):",
+                                    className="section-help",
+                                    style={"marginTop": "10px"},
+                                ),
+                                dcc.Textarea(
+                                    id="formula-text",
+                                    placeholder=(
+                                        "Solids flux, t/h = [Feed, m3/h] * [Underflow, kg/m3] / 1000\n"
+                                        "Floc per solids = [Floc_Dosage_g/t] / max([Underflow_%S], 1)"
+                                    ),
+                                    style={"width": "100%", "height": 70, "fontFamily": "monospace"},
+                                ),
+                                html.Div(id="formula-feedback", className="section-help"),
                                 html.Button(
                                     "Apply transformations",
                                     id="apply-transformations",
@@ -358,6 +409,36 @@ def display_page(pathname):
                                     className="primary-button",
                                     style={"marginTop": "10px"},
                                 ),
+                                html.Button(
+                                    "↩ Undo",
+                                    id="undo-transformations",
+                                    n_clicks=0,
+                                    disabled=True,
+                                    className="history-button",
+                                    style={"marginTop": "10px", "marginLeft": "8px"},
+                                ),
+                                html.Button(
+                                    "↪ Redo",
+                                    id="redo-transformations",
+                                    n_clicks=0,
+                                    disabled=True,
+                                    className="history-button",
+                                    style={"marginTop": "10px", "marginLeft": "4px"},
+                                ),
+                                html.Button(
+                                    "Cancel",
+                                    id="cancel-transformations",
+                                    n_clicks=0,
+                                    className="secondary-button",
+                                    style={"marginTop": "10px", "marginLeft": "8px", "display": "none"},
+                                ),
+                                dbc.Progress(
+                                    id="transformation-progress",
+                                    value=0,
+                                    striped=True,
+                                    animated=True,
+                                    style=PROGRESS_HIDDEN,
+                                ),
                                 html.Div(
                                     id="transformation-status",
                                     className="section-help",
@@ -428,16 +509,39 @@ def display_page(pathname):
 # Callback: upload + botón X
 # =========================
 
+def _file_label(filename):
+    return html.Span(
+        [
+            html.Img(
+                src="/assets/excel-icon.png",
+                style={"width": "20px", "marginRight": "10px"},
+            ),
+            f"{filename}",
+        ]
+    )
+
+
 @app.callback(
     [
         Output("stored-data", "data"),
         Output("upload-text", "children"),
         Output("raw-data", "data"),          # 👈 NUEVO
     ],
-    [Input("upload-data", "contents"), Input("remove-upload", "n_clicks")],
+    [
+        Input("upload-data", "contents"),
+        Input("remove-upload", "n_clicks"),
+    ],
     [State("upload-data", "filename")],
+    # Parseo en un proceso aparte; la X cancela una carga en curso. Sin
+    # caché: el resultado depende de qué input disparó (subir / X), no solo
+    # de sus valores (el parseo ya se reutiliza por hash en core.ingest)
+    background=True,
+    manager=jobs.uncached,
+    progress=[Output("upload-progress", "value"), Output("upload-progress", "label")],
+    running=[(Output("upload-progress", "style"), PROGRESS_SHOWN, PROGRESS_HIDDEN)],
+    cancel=[Input("remove-upload", "n_clicks")],
 )
-def handle_uploaded_file(contents, remove_clicks, filename):
+def handle_uploaded_file(set_progress, contents, remove_clicks, filename):
     ctx = dash.callback_context
 
     # Carga inicial de la app
@@ -450,34 +554,24 @@ def handle_uploaded_file(contents, remove_clicks, filename):
     if trigger == "remove-upload":
         return None, "Drop or Select a File", None
 
-    # Si se cargó un archivo nuevo
+    # Si se cargó un archivo nuevo (fallback base64 de dcc.Upload)
     if trigger == "upload-data" and contents is not None:
+        set_progress((10, "Reading file…"))
         content_type, content_string = contents.split(",")
         decoded = base64.b64decode(content_string)
         try:
-            df = pd.read_excel(
-                io.BytesIO(decoded),
-                sheet_name=0,
-                skiprows=6,
-                engine="openpyxl",
-            )
-            # Columnas D a N
-            df = df.iloc[:, 3:14]
-            # Primera columna como datetime
-            df.iloc[:, 0] = pd.to_datetime(df.iloc[:, 0], errors="coerce")
-
-            file_label = html.Span(
-                [
-                    html.Img(
-                        src="/assets/excel-icon.png",
-                        style={"width": "20px", "marginRight": "10px"},
-                    ),
-                    f"{filename}",
-                ]
-            )
-            records = df.to_dict("records")
-            # 👇 guardamos tanto en stored-data como en raw-data
-            return records, file_label, records
+            # Parseo en streaming (xlsx/xls/csv, columnas D–N, tiempo como
+            # datetime), cacheado por hash del contenido: re-subir el mismo
+            # archivo no lo re-parsea
+            set_progress((30, "Parsing file…"))
+            handle = ingest.ingest_bytes(decoded, filename)
+            # El proceso del trabajo termina al devolver: la pirámide se
+            # completa aquí y no en un hilo
+            set_progress((80, "Precomputing resample levels and window indexes…"))
+            pyramid.build(handle)
+            windows.build(handle)
+            # 👇 guardamos el mismo handle en stored-data y en raw-data
+            return handle, _file_label(filename), handle
         except Exception as e:
             print("Error al leer el archivo:", e)
             return None, "Error reading file. Try again.", None
@@ -485,6 +579,52 @@ def handle_uploaded_file(contents, remove_clicks, filename):
     # Fallback
     return None, "Drop or Select a File", None
 
+
+# Archivo subido por chunks: el parseo ya empezó en el servidor al recibir
+# el último trozo. El callback no espera: si no terminó, activa
+# "upload-poll" y vuelve a preguntar en el próximo tick.
+@app.callback(
+    [
+        Output("stored-data", "data", allow_duplicate=True),
+        Output("upload-text", "children", allow_duplicate=True),
+        Output("raw-data", "data", allow_duplicate=True),
+        Output("upload-poll", "disabled"),
+        Output("upload-poll", "n_intervals"),
+    ],
+    [
+        Input("upload-token", "data"),
+        Input("upload-poll", "n_intervals"),
+        Input("remove-upload", "n_clicks"),
+    ],
+    prevent_initial_call=True,
+)
+def poll_chunked_upload(upload_token, n_intervals, remove_clicks):
+    trigger = dash.callback_context.triggered[0]["prop_id"].split(".")[0]
+
+    # La X la atiende handle_uploaded_file; aquí solo se deja de preguntar
+    if trigger == "remove-upload" or not upload_token:
+        return no_update, no_update, no_update, True, 0
+
+    # Subida nueva: se cuenta el tiempo desde cero
+    if trigger == "upload-token":
+        n_intervals = 0
+
+    try:
+        handle = uploads.poll(upload_token.get("token"))
+    except Exception as e:
+        print("Error al leer el archivo:", e)
+        return None, "Error reading file. Try again.", None, True, 0
+
+    if handle is None:
+        if (n_intervals or 0) * UPLOAD_POLL_MS >= UPLOAD_TIMEOUT_S * 1000:
+            print("Error al leer el archivo: tiempo de espera agotado")
+            return None, "Error reading file. Try again.", None, True, 0
+        n_next = 0 if trigger == "upload-token" else no_update
+        return no_update, no_update, no_update, False, n_next
+
+    name = upload_token.get("filename") or "file"
+    return handle, _file_label(name), handle, True, 0
+
 # =========================
 # Callback: guardar metadata del proyecto
 # =========================
@@ -521,90 +661,153 @@ def store_project_meta(project_name, operation_name, thickener_type, user_name):
     [
         Output("stored-data", "data", allow_duplicate=True),
         Output("transformation-status", "children"),
+        Output("transform-history", "data", allow_duplicate=True),
     ],
     Input("apply-transformations", "n_clicks"),
     State("raw-data", "data"),           # 👈 leemos SIEMPRE de los datos crudos
+    State("transform-history", "data"),
     State("specific-gravity", "value"),
     State("flocculant-strength", "value"),
     State("data-transformation-options", "value"),
+    State("formula-text", "value"),
     prevent_initial_call=True,           # 👈 opcional pero limpio: no se llama al inicio
+    background=True,
+    progress=[
+        Output("transformation-progress", "value"),
+        Output("transformation-progress", "label"),
+    ],
+    running=[
+        (Output("apply-transformations", "disabled"), True, False),
+        (Output("transformation-progress", "style"), PROGRESS_SHOWN, PROGRESS_HIDDEN),
+        (Output("cancel-transformations", "style"),
+         {"marginTop": "10px", "marginLeft": "8px"},
+         {"display": "none"}),
+    ],
+    cancel=[Input("cancel-transformations", "n_clicks")],
+    # Mismos datos y parámetros -> mismo resultado aunque cambie n_clicks
+    cache_args_to_ignore=[0],
 )
-def apply_transformations(n_clicks, raw_data, specific_gravity, flocc_strength, options):
+def apply_transformations(set_progress, n_clicks, raw_data, history, specific_gravity, flocc_strength, options, formula_text):
     if not n_clicks:
         # No se ha presionado el botón todavía
-        return raw_data, ""   # devolvemos lo que haya (o None)
+        return raw_data, "", no_update   # devolvemos lo que haya (o None)
 
     if raw_data is None:
-        return raw_data, "⚠️ Please upload a file before applying transformations."
+        return raw_data, "⚠️ Please upload a file before applying transformations.", None
+
+    # Pasos de core.transforms: solo se recalculan los que cambiaron de
+    # parámetros, y el resultado completo queda memoizado
+    set_progress((10, "Loading data…"))
+    result = transforms.apply(
+        raw_data,
+        options,
+        {"specific_gravity": specific_gravity, "flocc_strength": flocc_strength},
+        formula_text=formula_text,
+        progress=lambda value, label: set_progress((value, label)),
+    )
+    if result is None:
+        return None, "⚠️ Uploaded data expired on the server. Please upload the file again.", None
+    handle, messages = result
+
+    # Niveles de resample de la nueva versión (ya estamos en segundo plano)
+    set_progress((80, "Precomputing resample levels and window indexes…"))
+    pyramid.build(handle)
+    windows.build(handle)
+    return handle, " | ".join(messages), _push_history(history, raw_data, handle)
 
-    df = pd.DataFrame(raw_data).copy()
-    messages = []
 
-    # --- 1) Densidad (kg/m3) -> %S ---
-    if "density_to_percent_s" in (options or []):
-        if UNDERFLOW_DENSITY_COL not in df.columns:
-            messages.append(f"❌ Column '{UNDERFLOW_DENSITY_COL}' not found in data.")
-        elif specific_gravity is None or specific_gravity <= 1:
-            messages.append("❌ Please enter a valid Solid Specific Gravity (>1).")
-        else:
-            try:
-                rho_pulp = df[UNDERFLOW_DENSITY_COL].astype(float)
-                rho_w = 1000.0  # kg/m3
-                rho_s = float(specific_gravity) * 1000.0
-
-                ws = (rho_pulp - rho_w) / (rho_s - rho_w)
-                percent_s = ws * 100.0
-                df["Underflow_%S"] = percent_s.clip(lower=0, upper=100)
-                messages.append("✅ Created column 'Underflow_%S' from density.")
-            except Exception as e:
-                print("Error converting density to %S:", e)
-                messages.append("❌ Error converting density to % solids.")
-
-    # --- 2) Flocculant flow (L/min) -> g/t ---
-    if "flocc_to_gt" in (options or []):
-        if FLOCC_LMIN_COL not in df.columns:
-            messages.append(f"❌ Column '{FLOCC_LMIN_COL}' not found in data.")
-        elif TONNAGE_COL not in df.columns:
-            messages.append(f"❌ Column '{TONNAGE_COL}' not found in data.")
-        elif flocc_strength is None or flocc_strength <= 0:
-            messages.append("❌ Please enter a valid Flocculant Strength (g/L).")
-        else:
-            try:
-                q_lmin = df[FLOCC_LMIN_COL].astype(float)
-                tph = df[TONNAGE_COL].astype(float).replace(0, np.nan)
-                c_gl = float(flocc_strength)  # g/L
-
-                df["Floc_Dosage_g/t"] = q_lmin * c_gl*10* 60.0 / tph
-                messages.append("✅ Created column 'Floc_Dosage_g/t' from L/min.")
-            except Exception as e:
-                print("Error converting floc L/min to g/t:", e)
-                messages.append("❌ Error converting flocculant L/min to g/t.")
-
-    # --- 3) Flocculant flow (m3/h) -> g/t ---
-    if "flocc_to_gt_m3h" in (options or []):
-        if FLOCC_M3H_COL not in df.columns:
-            messages.append(f"❌ Column '{FLOCC_M3H_COL}' not found in data.")
-        elif TONNAGE_COL not in df.columns:
-            messages.append(f"❌ Column '{TONNAGE_COL}' not found in data.")
-        elif flocc_strength is None or flocc_strength <= 0:
-            messages.append("❌ Please enter a valid Flocculant Strength (g/L).")
+# =========================
+# Validación de fórmulas mientras se escriben
+# =========================
+@app.callback(
+    Output("formula-feedback", "children"),
+    Input("formula-text", "value"),
+    State("raw-data", "data"),
+    prevent_initial_call=True,
+)
+def check_formulas(text, raw_data):
+    if not text or not text.strip():
+        return ""
+    summary = datasets.manifest(raw_data) or {}
+    # Tags del archivo + columnas que crean las conversiones fijas
+    available = list(summary.get("numeric_columns", [])) + [s["output"] for s in transforms.STEPS]
+    lines = []
+    for lineno, name, error in formulas.check_text(text, available):
+        if error is None:
+            lines.append(html.Div(f"✅ {name}"))
+        elif lineno is None:
+            lines.append(html.Div(f"❌ {error}"))
         else:
-            try:
-                q_m3h = df[FLOCC_M3H_COL].astype(float)
-                tph = df[TONNAGE_COL].astype(float).replace(0, np.nan)
-                c_gl = float(flocc_strength)  # g/L
-
-                # m3/h → L/min (·1000/60) y misma lógica g/t
-                df["Floc_Dosage_g/t"] = q_m3h * (1000.0 / 60.0) *10* c_gl * 60.0 / tph
-                messages.append("✅ Created/updated column 'Floc_Dosage_g/t' from m3/h.")
-            except Exception as e:
-                print("Error converting floc m3/h to g/t:", e)
-                messages.append("❌ Error converting flocculant m3/h to g/t.")
-
-    if not messages:
-        messages.append("ℹ️ No transformation selected or nothing was applied.")
-
-    return df.to_dict("records"), " | ".join(messages)
+            lines.append(html.Div(f"❌ Line {lineno} ({name}): {error}"))
+    return lines
+
+
+# =========================
+# Undo / redo de transformaciones
+# =========================
+# Cada versión transformada es un overlay sobre los datos crudos
+# (core.datasets.register_overlay): deshacer/rehacer solo cambia de handle.
+def _push_history(history, raw_data, handle):
+    if not history or not history.get("stack") or history["stack"][0] != raw_data:
+        history = {"stack": [raw_data], "pos": 0}
+    stack = history["stack"][: history["pos"] + 1]
+    if stack[-1] != handle:
+        stack.append(handle)
+    return {"stack": stack, "pos": len(stack) - 1}
+
+
+def _history_label(handle, raw_data):
+    if handle == raw_data:
+        return "raw data"
+    summary = datasets.manifest(handle) or {}
+    raw_summary = datasets.manifest(raw_data) or {}
+    derived = [c for c in summary.get("numeric_columns", []) if c not in raw_summary.get("numeric_columns", [])]
+    return f"derived columns: {', '.join(derived)}" if derived else "transformed data"
+
+
+@app.callback(
+    [
+        Output("stored-data", "data", allow_duplicate=True),
+        Output("transform-history", "data", allow_duplicate=True),
+        Output("transformation-status", "children", allow_duplicate=True),
+    ],
+    Input("undo-transformations", "n_clicks"),
+    Input("redo-transformations", "n_clicks"),
+    State("transform-history", "data"),
+    State("raw-data", "data"),
+    prevent_initial_call=True,
+)
+def undo_redo_transformations(_undo, _redo, history, raw_data):
+    # Historial de otro archivo (se subió uno nuevo): nada que hacer
+    if not history or not raw_data or history["stack"][0] != raw_data:
+        return no_update, None, no_update
+    trigger = dash.callback_context.triggered[0]["prop_id"].split(".")[0]
+    step = -1 if trigger == "undo-transformations" else 1
+    pos = history["pos"] + step
+    if not 0 <= pos < len(history["stack"]):
+        return no_update, no_update, no_update
+    handle = history["stack"][pos]
+    verb = "↩️ Undo" if step < 0 else "↪️ Redo"
+    return handle, {**history, "pos": pos}, f"{verb}: now using {_history_label(handle, raw_data)}."
+
+
+# Habilitar undo/redo según la posición en el historial (en el navegador)
+app.clientside_callback(
+    """
+    function (history, raw) {
+        var ok = history && history.stack && raw &&
+            JSON.stringify(history.stack[0]) === JSON.stringify(raw);
+        if (!ok) {
+            return [true, true];
+        }
+        return [history.pos <= 0, history.pos >= history.stack.length - 1];
+    }
+    """,
+    Output("undo-transformations", "disabled"),
+    Output("redo-transformations", "disabled"),
+    Input("transform-history", "data"),
+    Input("raw-data", "data"),
+)
 
 # =========================
 # Run local
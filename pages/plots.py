@@ -1,54 +1,380 @@
 # pages/plots.py
+import os
+
 import dash
-from dash import html, dcc, Input, Output, State, no_update
+from dash import html, dcc, dash_table, Input, Output, State, Patch, no_update
 import dash_bootstrap_components as dbc
 import plotly.graph_objs as go
 import plotly.io as pio
+from plotly.subplots import make_subplots
 import numpy as np
 import pandas as pd
 from datetime import datetime, date
-import base64
+
+from core import compare, compliance, datasets, downsample, jobs, pyramid, render, report_export, reports, windows
 
 dash.register_page(__name__, path="/plots", name="Plots")
 
+# Trazas con más puntos que esto se dibujan con WebGL (Scattergl) en la UI
+WEBGL_MIN_POINTS = int(os.environ.get("THICKDATA_WEBGL_POINTS", "50000"))
+
+# Barra de progreso del reporte (mismo estilo que las de index.py)
+PROGRESS_SHOWN = {"height": "16px", "marginTop": "8px"}
+PROGRESS_HIDDEN = {"display": "none"}
+
 # -----------------------------
 # Helpers
 # -----------------------------
-def _get_df(stored):
+def _get_df(stored, columns=None):
+    # stored es un handle {"id", "version"}; el DataFrame vive en core.datasets.
+    # columns: solo mapear esas columnas desde disco (el tiempo siempre va).
     if not stored:
         return None, "No data loaded. Go back and upload an Excel file."
-    df = pd.DataFrame(stored)
+    df = datasets.get(stored, columns=columns)
+    if df is None:
+        return None, "Data expired on the server. Go back and upload the file again."
     if df.empty:
         return None, "Empty DataFrame."
     time_col = df.columns[0]
-    try:
-        df[time_col] = pd.to_datetime(df[time_col], errors="coerce")
-    except Exception:
+    if not pd.api.types.is_datetime64_any_dtype(df[time_col]):
         return None, f"Failed to parse first column ({time_col}) as datetime."
     if df[time_col].isna().all():
         return None, f"First column ({time_col}) has no valid datetime."
     return df, time_col
 
 
-def _resample(dff, time_col, rule):
+def _resample(stored, dff, time_col, rule, columns=None):
     if not rule:
         return dff
+    # Niveles precalculados (core.pyramid): solo una lectura
+    level = pyramid.get_level(stored, rule, columns=columns)
+    if level is not None:
+        return level
     dff = dff.set_index(time_col)
     dff = dff.resample(rule).mean(numeric_only=True)
     dff = dff.reset_index()
     return dff
 
 
+def _time_window(x, x_range):
+    # x ordenado (los datasets se guardan ordenados por tiempo): búsqueda
+    # binaria en vez de máscaras booleanas. Un punto extra a cada lado para
+    # que la línea llegue a los bordes de la vista.
+    if not x_range:
+        return slice(None)
+    lo = np.datetime64(pd.Timestamp(x_range[0]).tz_localize(None), "ns")
+    hi = np.datetime64(pd.Timestamp(x_range[1]).tz_localize(None), "ns")
+    i0 = max(int(np.searchsorted(x, lo, side="left")) - 1, 0)
+    i1 = min(int(np.searchsorted(x, hi, side="right")) + 1, len(x))
+    return slice(i0, i1)
+
+
+def _ts_series(dff, time_col, traces, x_range=None):
+    # traces: [(col, axis)]. Devuelve [(x, y)], nº de muestras en la ventana
+    # y si alguna traza fue decimada.
+    x_all = dff[time_col].to_numpy()
+    window = _time_window(x_all, x_range)
+    x_win = x_all[window]
+    out, decimated = [], False
+    for col, _axis in traces:
+        x, y, was_decimated = downsample.decimate(x_win, dff[col].to_numpy()[window])
+        decimated = decimated or was_decimated
+        out.append((x, y))
+    return out, len(x_win), decimated
+
+
+def _decimation_note(n_samples, decimated, zoomed=False):
+    if not decimated:
+        if not zoomed:
+            return []
+        text = f"Full resolution: {n_samples:,} samples in view"
+    else:
+        text = (
+            f"Decimated view (min/max): ≤{downsample.MAX_POINTS_PER_TRACE:,} "
+            f"points per trace of {n_samples:,} samples"
+        )
+    return [
+        dict(
+            text=text,
+            xref="paper",
+            yref="paper",
+            x=1,
+            y=1.08,
+            xanchor="right",
+            showarrow=False,
+            font=dict(size=11, color="#666"),
+        )
+    ]
+
+
+def _relayout_range(relayout):
+    # None = sin cambio en el eje x; "reset" = autorange; [x0, x1] = zoom/pan
+    if not relayout:
+        return None
+    if relayout.get("xaxis.autorange"):
+        return "reset"
+    if "xaxis.range[0]" in relayout and "xaxis.range[1]" in relayout:
+        return [relayout["xaxis.range[0]"], relayout["xaxis.range[1]"]]
+    if isinstance(relayout.get("xaxis.range"), list):
+        return relayout["xaxis.range"][:2]
+    return None
+
+
+def _scatter_type(n_points):
+    return "scattergl" if n_points > WEBGL_MIN_POINTS else "scatter"
+
+
+def _scatter(x, y, **kwargs):
+    # SVG para pocas muestras, WebGL para trazas densas
+    cls = go.Scattergl if _scatter_type(len(y)) == "scattergl" else go.Scatter
+    return cls(x=x, y=y, **kwargs)
+
+
+def _svg_figure(fig):
+    # Para exportar con kaleido: sin WebGL (se vuelve a SVG)
+    fig = go.Figure(fig)
+    if not any(t.type == "scattergl" for t in fig.data):
+        return fig
+    data = []
+    for t in fig.data:
+        if t.type == "scattergl":
+            spec = t.to_plotly_json()
+            spec.pop("type", None)
+            t = go.Scatter(spec)
+        data.append(t)
+    return go.Figure(data=data, layout=fig.layout)
+
+
+def _reference_shapes(line1_val, axis1, line2_val, axis2):
+    # Líneas horizontales "Customer Input" a lo ancho de todo el gráfico
+    shapes = []
+    for value, axis, color in ((line1_val, axis1, "red"), (line2_val, axis2, "blue")):
+        if value is None or axis not in ["y1", "y2"]:
+            continue
+        shapes.append(
+            dict(
+                type="line",
+                xref="paper",
+                x0=0,
+                x1=1,
+                y0=value,
+                y1=value,
+                line=dict(color=color, dash="dash"),
+                yref="y" if axis == "y1" else "y2",
+            )
+        )
+    return shapes
+
+
+def _secondary_axis():
+    return dict(overlaying="y", side="right", title="Secondary Y axis")
+
+
+def _target_layout(target, tol):
+    # Línea de target + banda ±tolerancia (shapes y anotaciones)
+    low, high = target - tol, target + tol
+    shapes = [
+        dict(
+            type="rect", xref="paper", x0=0, x1=1, yref="y", y0=low, y1=high,
+            line=dict(width=0), fillcolor="LightBlue", opacity=0.2,
+        ),
+        dict(
+            type="line", xref="paper", x0=0, x1=1, yref="y", y0=target, y1=target,
+            line=dict(color="blue", dash="dash"),
+        ),
+    ]
+    annotations = [
+        dict(
+            text="Target", xref="paper", x=0, yref="y", y=target,
+            xanchor="left", yanchor="bottom", showarrow=False,
+        ),
+        dict(
+            text=f"±{tol}", xref="paper", x=1, yref="y", y=(low + high) / 2,
+            xanchor="right", showarrow=False,
+        ),
+    ]
+    return shapes, annotations
+
+
+# (índice de la columna, i, j): filas [i, j) de la ventana (día de fin
+# incluido), ubicadas por búsqueda binaria en core.windows. None si no hay datos.
+def _target_window(stored, param, start, end):
+    idx = windows.get(stored, param)
+    if idx is None:
+        return None
+    i, j = windows.bounds(idx, pd.to_datetime(start), pd.to_datetime(end) + pd.Timedelta(days=1))
+    return idx, i, j
+
+
+# KPIs de la ventana: conteos desde las sumas acumuladas y los sketches de
+# cuantiles; tiempo dentro de banda y excursiones (run-length) desde la
+# ventana. Devuelve (kpis, eventos de excursión).
+def _target_kpis(window, target, tol):
+    idx, i, j = window
+    low, high = target - tol, target + tol
+    below, within, above = windows.threshold_counts(idx, i, j, low, high)
+    kpis = {
+        "below": below,
+        "within": within,
+        "above": above,
+        "pct_in": 100 * within / (j - i),
+        "mean": windows.moments(idx, i, j)["mean"],
+        "median": float(windows.quantiles(idx, i, j, [50])[0]),
+        "samples": int(j - i),
+    }
+    stats, events = compliance.excursions(idx["time"][i:j], idx["values"][i:j], low, high)
+    kpis.update(stats)
+    return kpis, events
+
+
+def _fmt_hours(h):
+    return f"{h * 60:.0f} min" if h < 1 else f"{h:.1f} h"
+
+
+def _target_badges(k):
+    return [
+        _kpi("% time within", f"{k['pct_time_in']:.1f}%"),
+        _kpi("% samples within", f"{k['pct_in']:.1f}%"),
+        _kpi("Below", f"{k['below']}"),
+        _kpi("Within", f"{k['within']}"),
+        _kpi("Above", f"{k['above']}"),
+        _kpi("Excursions ↓/↑", f"{k['excursions_below']}/{k['excursions_above']}"),
+        _kpi("Longest excursion", _fmt_hours(k["longest_excursion_h"])),
+        _kpi("Time out of band", _fmt_hours(k["time_out_h"])),
+        _kpi("Mean", f"{k['mean']:.2f}"),
+        _kpi("Median", f"{k['median']:.2f}"),
+        _kpi("Samples", f"{k['samples']}"),
+    ]
+
+
+# Excursiones como franjas sombreadas (solo las MAX_SHADED más largas)
+MAX_SHADED = 300
+_EXCURSION_COLORS = {compliance.BELOW: "orange", compliance.ABOVE: "red"}
+
+
+def _excursion_shapes(events):
+    order = np.argsort(events["secs"])[::-1][:MAX_SHADED]
+    return [
+        dict(
+            type="rect", xref="x", yref="paper", y0=0, y1=1,
+            x0=pd.Timestamp(events["start"][k]).isoformat(),
+            x1=pd.Timestamp(events["end"][k]).isoformat(),
+            fillcolor=_EXCURSION_COLORS[int(events["kind"][k])],
+            opacity=0.15, layer="below", line=dict(width=0),
+        )
+        for k in np.sort(order)
+    ]
+
+
+def _numeric_options(stored):
+    summary = datasets.manifest(stored)
+    if not summary:
+        return []
+    return [{"label": c, "value": c} for c in summary["numeric_columns"]]
+
+
 def _kpi(label, val):
     return dbc.Badge(f"{label}: {val}", color="light", text_color="dark", className="p-2")
 
 
-def _fig_to_base64_png(fig, width=1200, height=650):
-    try:
-        png_bytes = pio.to_image(fig, format="png", width=width, height=height, scale=2)
-        return "data:image/png;base64," + base64.b64encode(png_bytes).decode("utf-8")
-    except Exception:
-        return None
+# -----------------------------
+# Before vs After (tabla + figura)
+# -----------------------------
+BA_COLUMNS = [
+    ("parameter", "Parameter"), ("segment", "Segment"), ("n", "n (non-NaN)"),
+    ("mean", "Mean"), ("std", "Std"), ("p5", "P5"), ("p50", "P50"),
+    ("p95", "P95"), ("delta_mean_pct", "Δ mean %"),
+]
+
+
+def _fmt_stat(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "—"
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def _ba_table(rows):
+    head = html.Thead(html.Tr([html.Th(label) for _, label in BA_COLUMNS]))
+    body = html.Tbody([
+        html.Tr([html.Td(_fmt_stat(r[key])) for key, _ in BA_COLUMNS]) for r in rows
+    ])
+    return dbc.Table([head, body], bordered=True, hover=True, size="sm", className="mb-0")
+
+
+# Texto del resumen para el reporte: una línea por parámetro
+def _ba_summary_text(rows):
+    lines = {}
+    for r in rows:
+        lines.setdefault(r["parameter"], []).append(
+            f"{r['segment']} (n={r['n']} non-NaN): mean={_fmt_stat(r['mean'])}, "
+            f"p50={_fmt_stat(r['p50'])}, p5–p95=({_fmt_stat(r['p5'])}–{_fmt_stat(r['p95'])})"
+        )
+    if len(lines) == 1:
+        return "  |  ".join(next(iter(lines.values())))
+    return "\n".join(f"{p}: " + "  |  ".join(parts) for p, parts in lines.items())
+
+
+# Un subplot por parámetro (2 columnas), una caja por tramo. Las cajas van
+# con las estadísticas ya calculadas (core.compare.box_stats) y los outliers
+# como una muestra acotada: la figura pesa unos KB con cualquier tamaño de
+# datos, y ni el navegador ni kaleido recalculan cuartiles.
+def _ba_figure(stored, params, bounds, labels):
+    colors = pio.templates["plotly_white"].layout.colorway
+    if len(params) == 1:
+        fig = go.Figure()
+        ncols = 1
+    else:
+        ncols = 2
+        nrows = (len(params) + 1) // 2
+        fig = make_subplots(
+            rows=nrows, cols=ncols, subplot_titles=params,
+            vertical_spacing=min(0.12, 0.3 / nrows),
+        )
+    for j, param in enumerate(params):
+        idx = windows.get(stored, param)
+        pos = {} if len(params) == 1 else {"row": j // ncols + 1, "col": j % ncols + 1}
+        for k, label in enumerate(labels):
+            box = compare.box_stats(idx, bounds[k], bounds[k + 1])
+            if box is None:
+                continue
+            color = colors[k % len(colors)]
+            fig.add_trace(
+                go.Box(
+                    x=[label],
+                    q1=[box["q1"]], median=[box["median"]], q3=[box["q3"]],
+                    lowerfence=[box["lowerfence"]], upperfence=[box["upperfence"]],
+                    mean=[box["mean"]], sd=[box["sd"]],
+                    name=label,
+                    boxpoints=False,
+                    marker_color=color,
+                    legendgroup=label,
+                    showlegend=j == 0,
+                ),
+                **pos,
+            )
+            if len(box["outliers"]):
+                fig.add_trace(
+                    go.Scatter(
+                        x=[label] * len(box["outliers"]),
+                        y=box["outliers"],
+                        mode="markers",
+                        marker=dict(color=color, size=4, opacity=0.6),
+                        name=f"{label} outliers",
+                        legendgroup=label,
+                        showlegend=False,
+                        hovertemplate=f"%{{y}}<extra>{box['n_outliers']} outliers</extra>",
+                    ),
+                    **pos,
+                )
+    height = 550 if len(params) == 1 else max(550, 380 * ((len(params) + 1) // 2))
+    fig.update_layout(template="plotly_white", height=height)
+    if len(params) == 1:
+        fig.update_layout(yaxis_title=params[0])
+    return fig
 
 
 def _fig_to_inline_html(fig):
@@ -58,10 +384,44 @@ def _fig_to_inline_html(fig):
         return None
 
 
+# (spec, bytes de la imagen | None) para cada ítem del reporte. Se renderiza
+# al exportar, en lotes del tamaño del pool de kaleido (en paralelo y sin
+# tener todas las imágenes en memoria), y queda cacheado en core.reports.
+def _report_entries(specs, fmt="png"):
+    ext = "jpg" if fmt == "jpeg" else fmt
+    batch = max(1, render.RENDERERS)
+    for start in range(0, len(specs), batch):
+        chunk = specs[start:start + batch]
+        images = [reports.cached_image(s["id"], ext) for s in chunk]
+        missing = [i for i, img in enumerate(images) if img is None and chunk[i].get("figure")]
+        rendered = render.render_many(
+            [_svg_figure(go.Figure(chunk[i]["figure"])) for i in missing],
+            fmt=fmt, width=1200, height=650, scale=2,
+        )
+        for i, img in zip(missing, rendered):
+            if img:
+                reports.save_image(chunk[i]["id"], img, ext)
+                images[i] = img
+        yield from zip(chunk, images)
+
+
 # -----------------------------
 # Stores
 # -----------------------------
+# Solo IDs de ítems; los specs viven en el servidor (core.reports)
 report_store = dcc.Store(id="report-items", data=[])
+# Lo que muestra el gráfico principal (dataset, trazas, resample) para
+# re-pedir detalle al hacer zoom
+ts_view_store = dcc.Store(id="ts-view")
+# Ventana/parámetro del último "Generate" de Target (para re-calcular la banda)
+t_view_store = dcc.Store(id="t-view")
+# Cortes/parámetros y tabla de estadísticas del último "Generate" de Before
+# vs After (para el reporte)
+ba_view_store = dcc.Store(id="ba-view")
+# Tabla de resultados del último "Generate" de All-tag compliance, y los
+# targets por tag guardados en el navegador
+c_view_store = dcc.Store(id="c-view")
+c_targets_store = dcc.Store(id="c-saved-targets", storage_type="local")
 
 # -----------------------------
 # Toolbar
@@ -73,6 +433,7 @@ stats_toolbar = html.Div(
             [
                 dbc.Button("Before vs After", id="btn-before-after", color="secondary", outline=True),
                 dbc.Button("Target compliance", id="btn-target", color="primary"),
+                dbc.Button("All-tag compliance", id="btn-compliance", color="primary", outline=True),
             ],
             size="lg",
         ),
@@ -139,13 +500,19 @@ before_after_modal = dbc.Modal(
                     [
                         dbc.Col(
                             [
-                                html.Label("Cut-off date"),
-                                dbc.InputGroup(
+                                html.Label("Cut-off dates"),
+                                # Cada fecha elegida en el calendario se suma
+                                # a la lista; N cortes = N+1 tramos
+                                html.Div(
                                     [
-                                        dbc.Input(
-                                            id="ba_cutoff_display",
-                                            placeholder="Pick a date",
-                                            readonly=True,
+                                        dcc.Dropdown(
+                                            id="ba_cutoffs",
+                                            options=[],
+                                            value=[],
+                                            multi=True,
+                                            searchable=False,
+                                            placeholder="Pick one or more dates",
+                                            style={"flex": 1},
                                         ),
                                         dbc.Button(
                                             "📅",
@@ -155,18 +522,18 @@ before_after_modal = dbc.Modal(
                                             n_clicks=0,
                                         ),
                                     ],
-                                    size="md",
+                                    style={"display": "flex", "gap": "6px"},
                                 ),
                             ],
                             md=6,
                         ),
                         dbc.Col(
                             [
-                                html.Label("Parameter"),
+                                html.Label("Parameters"),
                                 dcc.Dropdown(
                                     id="ba_param",
-                                    placeholder="Select column",
-                                    clearable=False,
+                                    placeholder="Select column(s)",
+                                    multi=True,
                                 ),
                             ],
                             md=6,
@@ -396,6 +763,87 @@ target_modal = dbc.Modal(
     ],
 )
 
+compliance_modal = dbc.Modal(
+    id="modal-compliance",
+    is_open=False,
+    size="xl",
+    scrollable=True,
+    children=[
+        dbc.ModalHeader(dbc.ModalTitle("Compliance — All tags")),
+        dbc.ModalBody(
+            [
+                dbc.Row(
+                    [
+                        dbc.Col(
+                            [
+                                html.Label("Date range"),
+                                html.Div(
+                                    dcc.DatePickerRange(
+                                        id="c_range",
+                                        minimum_nights=0,
+                                        display_format="YYYY-MM-DD",
+                                    )
+                                ),
+                            ],
+                            md=7,
+                        ),
+                        dbc.Col(
+                            [
+                                html.Label("Rolling window (days)"),
+                                dcc.Input(
+                                    id="c_roll",
+                                    type="number",
+                                    min=1,
+                                    step=1,
+                                    value=7,
+                                    style={"width": "100%"},
+                                ),
+                            ],
+                            md=3,
+                        ),
+                    ],
+                    className="g-3",
+                ),
+                # Tabla de targets: los tags sin target se omiten. Se guarda
+                # en el navegador para la próxima revisión.
+                html.Label("Targets", style={"marginTop": "10px"}),
+                dash_table.DataTable(
+                    id="c_targets",
+                    columns=[
+                        {"name": "Tag", "id": "tag", "editable": False},
+                        {"name": "Target", "id": "target", "type": "numeric", "editable": True},
+                        {"name": "± Tolerance", "id": "tol", "type": "numeric", "editable": True},
+                    ],
+                    data=[],
+                    style_table={"maxHeight": "260px", "overflowY": "auto"},
+                    style_cell={"fontFamily": "Arial", "fontSize": "13px", "padding": "4px 8px"},
+                    style_header={"fontWeight": "bold"},
+                ),
+                dbc.Row(
+                    [
+                        dbc.Col(
+                            dbc.Button("Generate", id="c_go", color="primary"),
+                            md="auto",
+                        ),
+                        dbc.Col(
+                            dbc.Button("Add to report", id="c_add", color="success", outline=True),
+                            md="auto",
+                        ),
+                    ],
+                    className="g-2",
+                    style={"marginTop": "8px"},
+                ),
+                html.Hr(),
+                html.Div(id="c_table"),
+                dcc.Graph(id="c_graph", figure=go.Figure()),
+            ]
+        ),
+        dbc.ModalFooter(
+            dbc.Button("Close", id="c_close", color="secondary", outline=True)
+        ),
+    ],
+)
+
 # -----------------------------
 # Page layout
 # -----------------------------
@@ -548,7 +996,7 @@ layout = html.Div(
                                     ],
                                 ),
 
-                                # === Grid de acciones (3 filas x 2 columnas) ===
+                                # === Grid de acciones (4 filas x 2 columnas) ===
                                 html.Div(
                                     className="ts-buttons-grid",
                                     children=[
@@ -599,11 +1047,43 @@ layout = html.Div(
                                             className="btn",
                                         ),
 
+                                        # Fila 4
+                                        dbc.Button(
+                                            "Export PDF",
+                                            id="btn-export-pdf",
+                                            color="secondary",
+                                            outline=True,
+                                            className="btn",
+                                        ),
+                                        dbc.Button(
+                                            "Export ZIP",
+                                            id="btn-export-zip",
+                                            color="secondary",
+                                            outline=True,
+                                            className="btn",
+                                        ),
+
                                         # Downloads (no ocupan espacio visual)
                                         dcc.Download(id="download-graph"),
                                         dcc.Download(id="download-report"),
                                     ],
                                 ),
+
+                                # Progreso del reporte (se arma en segundo plano)
+                                dbc.Progress(
+                                    id="report-progress",
+                                    value=0,
+                                    striped=True,
+                                    animated=True,
+                                    style=PROGRESS_HIDDEN,
+                                ),
+                                html.Button(
+                                    "Cancel",
+                                    id="cancel-report",
+                                    n_clicks=0,
+                                    className="secondary-button",
+                                    style={"marginTop": "8px", "display": "none"},
+                                ),
                     
                             ],
                         )
@@ -643,7 +1123,13 @@ layout = html.Div(
         # Modals y store para el reporte (pueden ir fuera del content-container)
         before_after_modal,
         target_modal,
+        compliance_modal,
         report_store,
+        ts_view_store,
+        t_view_store,
+        ba_view_store,
+        c_view_store,
+        c_targets_store,
     ],
 )
 
@@ -657,15 +1143,7 @@ layout = html.Div(
     State("stored-data", "data"),
 )
 def fill_variable_options(_, stored):
-    df, time_col = _get_df(stored)
-    if df is None:
-        return [], []
-    num_cols = [
-        c
-        for c in df.columns
-        if c != time_col and pd.api.types.is_numeric_dtype(df[c])
-    ]
-    opts = [{"label": c, "value": c} for c in num_cols]
+    opts = _numeric_options(stored)
     return opts, opts
 
 
@@ -674,6 +1152,7 @@ def fill_variable_options(_, stored):
 # -----------------------------
 @dash.callback(
     Output("time-series-graph", "figure"),
+    Output("ts-view", "data"),
     Input("plot-button", "n_clicks"),
     State("stored-data", "data"),
     State("primary-variable", "value"),
@@ -686,7 +1165,7 @@ def fill_variable_options(_, stored):
     prevent_initial_call=True,
 )
 def update_time_series(
-    _,
+    n_clicks,
     stored,
     primaries,
     secondaries,
@@ -696,50 +1175,30 @@ def update_time_series(
     line2_val,
     axis2,
 ):
-    df, time_col = _get_df(stored)
-    if df is None:
-        return go.Figure()
-
     primaries = primaries or []
     secondaries = secondaries or []
 
-    dff = _resample(df.copy(), time_col, period) if period else df.copy()
+    df, time_col = _get_df(stored, columns=primaries + secondaries)
+    if df is None:
+        return go.Figure(), None
+
+    dff = _resample(stored, df, time_col, period, primaries + secondaries) if period else df
     fig = go.Figure()
 
-    if len(secondaries) > 0:
-        fig.update_layout(
-            yaxis2=dict(overlaying="y", side="right", title="Secondary Y axis")
-        )
+    uses_y2 = len(secondaries) > 0 or "y2" in (axis1, axis2)
+    if uses_y2:
+        fig.update_layout(yaxis2=_secondary_axis())
 
-    for col in primaries:
-        fig.add_trace(
-            go.Scatter(
-                x=dff[time_col], y=dff[col], mode="lines", name=col, yaxis="y1"
-            )
-        )
-    for col in secondaries:
+    # Vista general decimada (min/max); el detalle se pide al hacer zoom
+    traces = [(c, "y1") for c in primaries] + [(c, "y2") for c in secondaries]
+    series, n_samples, decimated = _ts_series(dff, time_col, traces)
+    for (col, axis), (x, y) in zip(traces, series):
         fig.add_trace(
-            go.Scatter(
-                x=dff[time_col], y=dff[col], mode="lines", name=col, yaxis="y2"
-            )
-        )
-
-    def add_hline(value, axis, color):
-        if value is None or axis not in ["y1", "y2"]:
-            return
-        fig.add_shape(
-            type="line",
-            x0=dff[time_col].min(),
-            x1=dff[time_col].max(),
-            y0=value,
-            y1=value,
-            line=dict(color=color, dash="dash"),
-            xref="x",
-            yref="y" if axis == "y1" else "y2",
+            _scatter(x, y, mode="lines", name=col, yaxis=axis)
         )
+    fig.update_layout(annotations=_decimation_note(n_samples, decimated))
 
-    add_hline(line1_val, axis1, "red")
-    add_hline(line2_val, axis2, "blue")
+    fig.update_layout(shapes=_reference_shapes(line1_val, axis1, line2_val, axis2))
 
     fig.update_layout(
         template="plotly_white",
@@ -750,8 +1209,75 @@ def update_time_series(
         legend=dict(
             orientation="h", yanchor="bottom", y=1.02, xanchor="left", x=0
         ),
+        # Mantiene el zoom del usuario cuando se actualizan los datos
+        uirevision=n_clicks,
     )
-    return fig
+    view = {"data": stored, "traces": traces, "period": period}
+    return fig, view
+
+
+# -----------------------------
+# Reference lines: solo shapes/ejes (Patch), sin re-enviar las trazas
+# -----------------------------
+@dash.callback(
+    Output("time-series-graph", "figure", allow_duplicate=True),
+    Input("line1-value", "value"),
+    Input("axis1-choice", "value"),
+    Input("line2-value", "value"),
+    Input("axis2-choice", "value"),
+    State("ts-view", "data"),
+    prevent_initial_call=True,
+)
+def update_reference_lines(line1_val, axis1, line2_val, axis2, view):
+    if not view:
+        return no_update
+    has_secondaries = any(axis == "y2" for _, axis in view.get("traces") or [])
+    uses_y2 = has_secondaries or "y2" in (axis1, axis2)
+
+    patched = Patch()
+    patched["layout"]["shapes"] = _reference_shapes(line1_val, axis1, line2_val, axis2)
+    if uses_y2:
+        patched["layout"]["yaxis2"] = _secondary_axis()
+    else:
+        # Volvió todo a y1: sin trazas secundarias no queda un eje vacío
+        del patched["layout"]["yaxis2"]
+    return patched
+
+
+# -----------------------------
+# Zoom / pan: detalle de la ventana visible
+# -----------------------------
+@dash.callback(
+    Output("time-series-graph", "figure", allow_duplicate=True),
+    Input("time-series-graph", "relayoutData"),
+    State("ts-view", "data"),
+    prevent_initial_call=True,
+)
+def refine_time_series(relayout, view):
+    x_range = _relayout_range(relayout)
+    if x_range is None or not view or not view.get("traces"):
+        return no_update
+
+    traces = [tuple(t) for t in view["traces"]]
+    df, time_col = _get_df(view["data"], columns=[c for c, _ in traces])
+    if df is None:
+        return no_update
+    period = view.get("period")
+    dff = _resample(view["data"], df, time_col, period, [c for c, _ in traces]) if period else df
+
+    zoomed = x_range != "reset"
+    series, n_samples, decimated = _ts_series(
+        dff, time_col, traces, x_range if zoomed else None
+    )
+
+    # Solo se mandan los datos de las trazas y la nota, no la figura entera
+    patched = Patch()
+    for i, (x, y) in enumerate(series):
+        patched["data"][i]["x"] = x
+        patched["data"][i]["y"] = y
+        patched["data"][i]["type"] = _scatter_type(len(y))
+    patched["layout"]["annotations"] = _decimation_note(n_samples, decimated, zoomed)
+    return patched
 
 
 # -----------------------------
@@ -773,160 +1299,152 @@ def save_graph_as_html(_, figure, project_name):
 # -----------------------------
 # Open analysis modals & options
 # -----------------------------
-@dash.callback(
+# Pura lógica de UI: se resuelve en el navegador (clientside), sin usar un
+# worker del servidor
+_TOGGLE_MODAL_JS = """
+function (nOpen, nClose, isOpen) {
+    if (nOpen || nClose) {
+        return !isOpen;
+    }
+    return isOpen;
+}
+"""
+
+dash.clientside_callback(
+    _TOGGLE_MODAL_JS,
     Output("modal-before-after", "is_open"),
     Input("btn-before-after", "n_clicks"),
     Input("ba_close", "n_clicks"),
     State("modal-before-after", "is_open"),
     prevent_initial_call=True,
 )
-def toggle_modal_ba(n_open, n_close, is_open):
-    if n_open or n_close:
-        return not is_open
-    return is_open
-
 
-@dash.callback(
+dash.clientside_callback(
+    _TOGGLE_MODAL_JS,
     Output("modal-target", "is_open"),
     Input("btn-target", "n_clicks"),
     Input("t_close", "n_clicks"),
     State("modal-target", "is_open"),
     prevent_initial_call=True,
 )
-def toggle_modal_t(n_open, n_close, is_open):
-    if n_open or n_close:
-        return not is_open
-    return is_open
+
+dash.clientside_callback(
+    _TOGGLE_MODAL_JS,
+    Output("modal-compliance", "is_open"),
+    Input("btn-compliance", "n_clicks"),
+    Input("c_close", "n_clicks"),
+    State("modal-compliance", "is_open"),
+    prevent_initial_call=True,
+)
 
 
 @dash.callback(
     Output("ba_param", "options"),
     Output("t_param", "options"),
-    Input("time-series-graph", "figure"),
-    State("stored-data", "data"),
+    Input("stored-data", "data"),
 )
-def populate_modal_options(_, stored):
-    df, time_col = _get_df(stored)
-    if df is None:
-        return [], []
-    num_cols = [
-        c
-        for c in df.columns
-        if c != time_col and pd.api.types.is_numeric_dtype(df[c])
-    ]
-    opts = [{"label": c, "value": c} for c in num_cols]
+def populate_modal_options(stored):
+    opts = _numeric_options(stored)
     return opts, opts
 
 
 # -----------------------------
-# Date ranges (available data)
+# Date ranges (available data) + initial visible month for calendars
 # -----------------------------
 @dash.callback(
     Output("ba_from_display", "value"),
     Output("ba_to_display", "value"),
     Output("ba_cutoff", "min_date_allowed"),
     Output("ba_cutoff", "max_date_allowed"),
-    Input("stored-data", "data"),
-)
-def update_ba_date_range(stored):
-    df, time_col = _get_df(stored)
-    if df is None or time_col is None:
-        today = date.today()
-        return "", "", today.replace(year=today.year - 1), today
-
-    df[time_col] = pd.to_datetime(df[time_col], errors="coerce")
-    df = df.dropna(subset=[time_col])
-    if df.empty:
-        today = date.today()
-        return "", "", today.replace(year=today.year - 1), today
-
-    d_min = df[time_col].min().date()
-    d_max = df[time_col].max().date()
-    return d_min.isoformat(), d_max.isoformat(), d_min, d_max
-
-
-@dash.callback(
     Output("t_from_display", "value"),
     Output("t_to_display", "value"),
     Output("t_range", "min_date_allowed"),
     Output("t_range", "max_date_allowed"),
-    Input("stored-data", "data"),
-)
-def update_t_date_range(stored):
-    df, time_col = _get_df(stored)
-    if df is None or time_col is None:
-        today = date.today()
-        return "", "", today.replace(year=today.year - 1), today
-
-    df[time_col] = pd.to_datetime(df[time_col], errors="coerce")
-    df = df.dropna(subset=[time_col])
-    if df.empty:
-        today = date.today()
-        return "", "", today.replace(year=today.year - 1), today
-
-    d_min = df[time_col].min().date()
-    d_max = df[time_col].max().date()
-    return d_min.isoformat(), d_max.isoformat(), d_min, d_max
-
-
-# -----------------------------
-# Initial visible month for calendars
-# -----------------------------
-@dash.callback(
     Output("ba_cutoff", "initial_visible_month"),
-    Input("stored-data", "data"),
-)
-def set_initial_month(stored):
-    df, time_col = _get_df(stored)
-    if df is not None and time_col is not None:
-        df[time_col] = pd.to_datetime(df[time_col], errors="coerce")
-        df = df.dropna(subset=[time_col])
-        if not df.empty:
-            d_min = df[time_col].min().date()
-            return d_min.replace(day=1)
-    return date.today().replace(day=1)
-
-
-@dash.callback(
     Output("t_range", "initial_visible_month"),
     Input("stored-data", "data"),
 )
-def set_t_initial_month(stored):
-    df, time_col = _get_df(stored)
-    if df is not None and time_col is not None:
-        df[time_col] = pd.to_datetime(df[time_col], errors="coerce")
-        df = df.dropna(subset=[time_col])
-        if not df.empty:
-            d_min = df[time_col].min().date()
-            return d_min.replace(day=1)
-    return date.today().replace(day=1)
+def update_available_dates(stored):
+    # Rango de tiempo desde el manifest del dataset (calculado al registrarlo)
+    summary = datasets.manifest(stored)
+    if not summary or not summary.get("start"):
+        today = date.today()
+        year_ago = today.replace(year=today.year - 1)
+        month = today.replace(day=1)
+        return "", "", year_ago, today, "", "", year_ago, today, month, month
+
+    d_min = pd.Timestamp(summary["start"]).date()
+    d_max = pd.Timestamp(summary["end"]).date()
+    month = d_min.replace(day=1)
+    return (
+        d_min.isoformat(), d_max.isoformat(), d_min, d_max,
+        d_min.isoformat(), d_max.isoformat(), d_min, d_max,
+        month, month,
+    )
 
 
 # -----------------------------
 # Calendar modals (BA & Target)
 # -----------------------------
-@dash.callback(
+# Clientside: abrir el calendario / mostrar la fecha elegida (YYYY-MM-DD)
+dash.clientside_callback(
+    """
+    function (btn, pickedDate, isOpen, cutoffs) {
+        const dc = window.dash_clientside;
+        const triggered = dc.callback_context.triggered;
+        const trigger = triggered.length ? triggered[0].prop_id.split(".")[0] : null;
+        if (trigger === "ba_cal_btn") {
+            return [!isOpen, dc.no_update, dc.no_update];  // open calendar
+        }
+        if (trigger === "ba_cutoff" && pickedDate) {
+            // pick date: se agrega a la lista de cortes (ordenada, sin repetir)
+            const day = String(pickedDate).slice(0, 10);
+            const dates = Array.from(new Set((cutoffs || []).concat([day]))).sort();
+            const options = dates.map(d => ({label: d, value: d}));
+            return [false, options, dates];
+        }
+        return [isOpen, dc.no_update, dc.no_update];
+    }
+    """,
     Output("ba_cal_modal", "is_open"),
-    Output("ba_cutoff_display", "value"),
+    Output("ba_cutoffs", "options"),
+    Output("ba_cutoffs", "value"),
     Input("ba_cal_btn", "n_clicks"),   # open calendar
     Input("ba_cutoff", "date"),        # pick date
     State("ba_cal_modal", "is_open"),
+    State("ba_cutoffs", "value"),
     prevent_initial_call=True,
 )
-def ba_modal_and_display(btn, picked_date, is_open):
-    ctx = dash.callback_context.triggered[0]["prop_id"].split(".")[0]
-    if ctx == "ba_cal_btn":
-        return (not is_open), no_update
-    if ctx == "ba_cutoff" and picked_date:
-        try:
-            val = pd.to_datetime(picked_date).date().isoformat()
-        except Exception:
-            val = picked_date
-        return False, val
-    return is_open, no_update
 
 
-@dash.callback(
+dash.clientside_callback(
+    """
+    function (openClicks, okClicks, start, end, isOpen) {
+        const dc = window.dash_clientside;
+        const triggered = dc.callback_context.triggered;
+        if (!triggered.length) {
+            return [isOpen, dc.no_update];
+        }
+        const trigger = triggered[0].prop_id.split(".")[0];
+
+        // Open calendar
+        if (trigger === "t_cal_btn") {
+            return [true, dc.no_update];
+        }
+
+        // Close with OK and update text
+        if (trigger === "t_cal_ok") {
+            if (start && end) {
+                const s = String(start).slice(0, 10);
+                const e = String(end).slice(0, 10);
+                return [false, s + " → " + e];
+            }
+            return [false, dc.no_update];
+        }
+
+        return [isOpen, dc.no_update];
+    }
+    """,
     Output("t_cal_modal", "is_open"),
     Output("t_range_display", "value"),
     Input("t_cal_btn", "n_clicks"),   # open calendar
@@ -936,29 +1454,6 @@ def ba_modal_and_display(btn, picked_date, is_open):
     State("t_cal_modal", "is_open"),
     prevent_initial_call=True,
 )
-def t_modal_and_display(open_clicks, ok_clicks, start, end, is_open):
-    ctx = dash.callback_context
-    if not ctx.triggered:
-        return is_open, no_update
-
-    trigger = ctx.triggered[0]["prop_id"].split(".")[0]
-
-    # Open calendar
-    if trigger == "t_cal_btn":
-        return True, no_update
-
-    # Close with OK and update text
-    if trigger == "t_cal_ok":
-        if start and end:
-            try:
-                s = pd.to_datetime(start).date().isoformat()
-                e = pd.to_datetime(end).date().isoformat()
-            except Exception:
-                s, e = start, end
-            return False, f"{s} → {e}"
-        return False, no_update
-
-    return is_open, no_update
 
 
 # -----------------------------
@@ -967,47 +1462,31 @@ def t_modal_and_display(open_clicks, ok_clicks, start, end, is_open):
 @dash.callback(
     Output("ba_graph", "figure"),
     Output("ba_summary", "children"),
+    Output("ba-view", "data"),
     Input("ba_go", "n_clicks"),
-    State("ba_cutoff", "date"),
+    State("ba_cutoffs", "value"),
     State("ba_param", "value"),
     State("stored-data", "data"),
     prevent_initial_call=True,
 )
-def generate_before_after(_, cutoff_date, param, stored):
-    df, time_col = _get_df(stored)
+def generate_before_after(_, cutoffs, params, stored):
+    params = [params] if isinstance(params, str) else (params or [])
+    df, time_col = _get_df(stored, columns=params or None)
     if df is None:
-        return go.Figure(), "No valid data."
-    if not cutoff_date or not param:
-        return go.Figure(), "Select cut-off date and parameter."
-
-    cutoff = pd.to_datetime(cutoff_date)
-    before = df[df[time_col] < cutoff]
-    after = df[df[time_col] >= cutoff]
-    if before.empty or after.empty:
-        return go.Figure(), "One side is empty with that date. Try another."
+        return go.Figure(), "No valid data.", None
+    if not cutoffs or not params:
+        return go.Figure(), "Select cut-off date(s) and parameter(s).", None
 
-    fig = go.Figure()
-    fig.add_trace(go.Box(y=before[param], name="Before", boxmean="sd"))
-    fig.add_trace(go.Box(y=after[param], name="After", boxmean="sd"))
-    fig.update_layout(template="plotly_white", yaxis_title=param, height=550)
-
-    def stats(x):
-        return {
-            "n": len(x),
-            "mean": float(np.nanmean(x)),
-            "p50": float(np.nanmedian(x)),
-            "p5": float(np.nanpercentile(x, 5)),
-            "p95": float(np.nanpercentile(x, 95)),
-        }
+    # Un solo searchsorted ubica todos los cortes; las estadísticas de todos
+    # los tramos y parámetros salen de una pasada (core.compare)
+    result = compare.compare(df, params, cutoffs, handle=stored)
+    bounds, labels = result["bounds"], result["labels"]
+    if any(b == a for a, b in zip(bounds[:-1], bounds[1:])):
+        return go.Figure(), "One segment is empty with those dates. Try others.", None
 
-    b, a = stats(before[param]), stats(after[param])
-    txt = (
-        f"Before (n={b['n']}): mean={b['mean']:.2f}, p50={b['p50']:.2f}, "
-        f"p5–p95=({b['p5']:.2f}–{b['p95']:.2f})  |  "
-        f"After (n={a['n']}): mean={a['mean']:.2f}, p50={a['p50']:.2f}, "
-        f"p5–p95=({a['p5']:.2f}–{a['p95']:.2f})"
-    )
-    return fig, txt
+    fig = _ba_figure(stored, params, bounds, labels)
+    view = {"params": params, "cutoffs": sorted(cutoffs), "rows": result["rows"]}
+    return fig, _ba_table(result["rows"]), view
 
 
 # -----------------------------
@@ -1016,6 +1495,7 @@ def generate_before_after(_, cutoff_date, param, stored):
 @dash.callback(
     Output("t_graph", "figure"),
     Output("t_kpis", "children"),
+    Output("t-view", "data"),
     Input("t_go", "n_clicks"),
     State("t_range", "start_date"),
     State("t_range", "end_date"),
@@ -1026,75 +1506,210 @@ def generate_before_after(_, cutoff_date, param, stored):
     prevent_initial_call=True,
 )
 def generate_target(_, start, end, param, target, tol, stored):
-    df, time_col = _get_df(stored)
-    if df is None:
-        return go.Figure(), [_kpi("Error", "No data")]
+    if not stored:
+        return go.Figure(), [_kpi("Error", "No data")], None
     if not (start and end and param and target is not None and tol is not None):
-        return go.Figure(), [_kpi("Info", "Complete all fields")]
-
-    start = pd.to_datetime(start)
-    end = pd.to_datetime(end) + pd.Timedelta(days=1)
-    dff = df[(df[time_col] >= start) & (df[time_col] < end)].copy()
-    if dff.empty:
-        return go.Figure(), [_kpi("Info", "No data in the selected window")]
-
-    low, high = target - tol, target + tol
-    below = int((dff[param] < low).sum())
-    within = int(((dff[param] >= low) & (dff[param] <= high)).sum())
-    above = int((dff[param] > high).sum())
-    pct_in = 100 * within / len(dff)
-
+        return go.Figure(), [_kpi("Info", "Complete all fields")], None
+
+    window = _target_window(stored, param, start, end)
+    if window is None:
+        return go.Figure(), [_kpi("Error", "No data")], None
+    idx, i, j = window
+    if i == j:
+        return go.Figure(), [_kpi("Info", "No data in the selected window")], None
+
+    # Línea decimada (min/max) + excursiones sombreadas: el tamaño de la
+    # figura no depende de la cantidad de muestras de la ventana
+    kpis, events = _target_kpis(window, target, tol)
+    x, y, _ = downsample.decimate(idx["time"][i:j].view("datetime64[ns]"), idx["values"][i:j])
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=dff[time_col], y=dff[param], mode="lines", name=param))
-    fig.add_hline(
-        y=target,
-        line_color="blue",
-        line_dash="dash",
-        annotation_text="Target",
-        annotation_position="top left",
-    )
-    fig.add_hrect(
-        y0=low,
-        y1=high,
-        line_width=0,
-        fillcolor="LightBlue",
-        opacity=0.2,
-        annotation_text=f"±{tol}",
-        annotation_position="right",
-    )
+    fig.add_trace(_scatter(x, y, mode="lines", name=param))
+    shapes, annotations = _target_layout(target, tol)
     fig.update_layout(
         template="plotly_white",
         yaxis_title=param,
         xaxis_title="Time",
         height=550,
+        shapes=shapes + _excursion_shapes(events),
+        annotations=annotations,
     )
 
-    kpis = [
-        _kpi("% within target", f"{pct_in:.1f}%"),
-        _kpi("Below", f"{below}"),
-        _kpi("Within", f"{within}"),
-        _kpi("Above", f"{above}"),
-        _kpi("Mean", f"{np.nanmean(dff[param]):.2f}"),
-        _kpi("Median", f"{np.nanmedian(dff[param]):.2f}"),
-        _kpi("Samples", f"{len(dff)}"),
+    view = {
+        "data": stored, "param": param, "start": start, "end": end,
+        "target": target, "tol": tol, "kpis": kpis,
+    }
+    return fig, _target_badges(kpis), view
+
+
+# Cambiar target/tolerancia tras "Generate": solo banda, excursiones y KPIs
+# (Patch)
+@dash.callback(
+    Output("t_graph", "figure", allow_duplicate=True),
+    Output("t_kpis", "children", allow_duplicate=True),
+    Output("t-view", "data", allow_duplicate=True),
+    Input("t_target", "value"),
+    Input("t_tol", "value"),
+    State("t-view", "data"),
+    prevent_initial_call=True,
+)
+def update_target_band(target, tol, view):
+    if not view or target is None or tol is None:
+        return no_update, no_update, no_update
+    window = _target_window(view["data"], view["param"], view["start"], view["end"])
+    if window is None or window[1] == window[2]:
+        return no_update, no_update, no_update
+
+    kpis, events = _target_kpis(window, target, tol)
+    shapes, annotations = _target_layout(target, tol)
+    patched = Patch()
+    patched["layout"]["shapes"] = shapes + _excursion_shapes(events)
+    patched["layout"]["annotations"] = annotations
+    return patched, _target_badges(kpis), {**view, "target": target, "tol": tol, "kpis": kpis}
+
+
+# -----------------------------
+# All-tag compliance
+# -----------------------------
+# Una fila por tag numérico, con el target/tolerancia guardados (si hay)
+@dash.callback(
+    Output("c_targets", "data"),
+    Output("c_range", "min_date_allowed"),
+    Output("c_range", "max_date_allowed"),
+    Output("c_range", "start_date"),
+    Output("c_range", "end_date"),
+    Input("stored-data", "data"),
+    State("c-saved-targets", "data"),
+)
+def populate_compliance(stored, saved):
+    saved = saved or {}
+    rows = [
+        {"tag": o["value"], **saved.get(o["value"], {"target": None, "tol": None})}
+        for o in _numeric_options(stored)
     ]
-    return fig, kpis
+    summary = datasets.manifest(stored)
+    if not summary or not summary.get("start"):
+        return rows, None, None, None, None
+    d_min = pd.Timestamp(summary["start"]).date()
+    d_max = pd.Timestamp(summary["end"]).date()
+    return rows, d_min, d_max, d_min, d_max
+
+
+@dash.callback(
+    Output("c-saved-targets", "data"),
+    Input("c_targets", "data_timestamp"),
+    State("c_targets", "data"),
+    State("c-saved-targets", "data"),
+    prevent_initial_call=True,
+)
+def save_compliance_targets(_, rows, saved):
+    saved = dict(saved or {})
+    for r in rows or []:
+        try:
+            saved[r["tag"]] = {"target": float(r["target"]), "tol": float(r["tol"])}
+        except (TypeError, ValueError):
+            saved.pop(r["tag"], None)
+    return saved
+
+
+C_COLUMNS = [
+    ("tag", "Tag"), ("target", "Target"), ("tol", "± Tol"), ("samples", "Samples"),
+    ("below", "Below"), ("within", "Within"), ("above", "Above"),
+    ("pct_in", "% within"), ("worst_day", "Worst day %"), ("best_day", "Best day %"),
+]
+
+
+def _c_table(rows):
+    head = html.Thead(html.Tr([html.Th(label) for _, label in C_COLUMNS]))
+    body = html.Tbody([
+        html.Tr([html.Td(_fmt_stat(r[key])) for key, _ in C_COLUMNS]) for r in rows
+    ])
+    return dbc.Table([head, body], bordered=True, hover=True, size="sm")
+
+
+# Small multiples: % dentro por día (barras) y ventana móvil (línea), un
+# panel por tag
+def _c_figure(result):
+    rows = result["rows"]
+    ncols = 1 if len(rows) == 1 else 2
+    nrows = (len(rows) + ncols - 1) // ncols
+    fig = make_subplots(
+        rows=nrows, cols=ncols, shared_xaxes=True,
+        subplot_titles=[f"{r['tag']} — {_fmt_stat(r['pct_in'])}%" for r in rows],
+        vertical_spacing=min(0.12, 0.35 / nrows),
+    )
+    colors = pio.templates["plotly_white"].layout.colorway
+    x = pd.to_datetime(result["days"])
+    for k in range(len(rows)):
+        pos = {"row": k // ncols + 1, "col": k % ncols + 1}
+        fig.add_trace(
+            go.Bar(
+                x=x, y=result["daily"][k], name="Daily % within",
+                marker_color=colors[0], opacity=0.45,
+                legendgroup="daily", showlegend=k == 0,
+            ),
+            **pos,
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=x, y=result["rolling"][k], mode="lines",
+                name=f"{result['window']}-day rolling %", line=dict(color=colors[1], width=2),
+                legendgroup="rolling", showlegend=k == 0,
+            ),
+            **pos,
+        )
+    fig.update_yaxes(range=[0, 100])
+    fig.update_layout(
+        template="plotly_white", height=max(420, 260 * nrows), bargap=0.1,
+        legend=dict(orientation="h", y=1.02, yanchor="bottom", x=0),
+    )
+    return fig
+
+
+@dash.callback(
+    Output("c_graph", "figure"),
+    Output("c_table", "children"),
+    Output("c-view", "data"),
+    Input("c_go", "n_clicks"),
+    State("c_targets", "data"),
+    State("c_range", "start_date"),
+    State("c_range", "end_date"),
+    State("c_roll", "value"),
+    State("stored-data", "data"),
+    prevent_initial_call=True,
+)
+def generate_compliance(_, rows, start, end, roll, stored):
+    if not stored:
+        return go.Figure(), "No data loaded.", None
+    targets = []
+    for r in rows or []:
+        try:
+            targets.append({"tag": r["tag"], "target": float(r["target"]), "tol": float(r["tol"])})
+        except (TypeError, ValueError):
+            continue   # sin target (o no numérico): se omite
+    if not targets or not (start and end):
+        return go.Figure(), "Set a target and tolerance for at least one tag, and a date range.", None
+
+    result = compliance.batch(stored, targets, start, end, days=roll or 7)
+    if result is None or not result["rows"][0]["samples"]:
+        return go.Figure(), "No data in the selected window.", None
+
+    view = {"start": start, "end": end, "window": result["window"], "rows": result["rows"]}
+    return _c_figure(result), _c_table(result["rows"]), view
 
 
 # -----------------------------
-# Add to report (BA, Target, Main TS)
+# Add to report (BA, Target, All-tag compliance, Main TS)
 # -----------------------------
 @dash.callback(
     Output("report-items", "data"),
     Input("ba_add", "n_clicks"),
     Input("t_add", "n_clicks"),
+    Input("c_add", "n_clicks"),
     Input("ts_add", "n_clicks"),
     State("report-items", "data"),
     # BA
     State("ba_graph", "figure"),
-    State("ba_summary", "children"),
-    State("ba_param", "value"),
-    State("ba_cutoff", "date"),
+    State("ba-view", "data"),
     # Target
     State("t_graph", "figure"),
     State("t_param", "value"),
@@ -1102,30 +1717,42 @@ def generate_target(_, start, end, param, target, tol, stored):
     State("t_tol", "value"),
     State("t_range", "start_date"),
     State("t_range", "end_date"),
+    State("t-view", "data"),
     State("stored-data", "data"),
+    # All-tag compliance
+    State("c_graph", "figure"),
+    State("c-view", "data"),
     # Main TS
     State("time-series-graph", "figure"),
     State("primary-variable", "value"),
     State("secondary-variable", "value"),
     State("time-period", "value"),
     prevent_initial_call=True,
+    running=[
+        (Output("ba_add", "disabled"), True, False),
+        (Output("t_add", "disabled"), True, False),
+        (Output("c_add", "disabled"), True, False),
+        (Output("ts_add", "disabled"), True, False),
+    ],
 )
 def add_to_report(
     ba_clicks,
     t_clicks,
+    c_clicks,
     ts_clicks,
     items,
     ba_fig,
-    ba_summary,
-    ba_param,
-    ba_cutoff,
+    ba_view,
     t_fig,
     t_param,
     t_target,
     t_tol,
     t_start,
     t_end,
+    t_view,
     stored,
+    c_fig,
+    c_view,
     ts_fig,
     primaries,
     secondaries,
@@ -1139,21 +1766,22 @@ def add_to_report(
 
     # Before vs After
     if trig == "ba_add":
-        if not ba_fig or not ba_param or not ba_cutoff:
+        if not ba_fig or not ba_view:
             return items
-        fig = go.Figure(ba_fig)
-        img_b64 = _fig_to_base64_png(fig)
+        rows = ba_view["rows"]
+        cutoffs = ba_view["cutoffs"]
         entry = {
             "type": "before_after",
-            "title": f"Before vs After — {ba_param}",
-            "meta": f"Cut-off: {ba_cutoff}",
-            "summary": ba_summary or "",
+            "title": f"Before vs After — {', '.join(ba_view['params'])}",
+            "meta": f"Cut-off{'s' if len(cutoffs) > 1 else ''}: {', '.join(cutoffs)}",
+            "summary": _ba_summary_text(rows),
+            "table": {
+                "columns": [label for _, label in BA_COLUMNS],
+                "rows": [[_fmt_stat(r[key]) for key, _ in BA_COLUMNS] for r in rows],
+            },
+            "figure": go.Figure(ba_fig),
         }
-        if img_b64:
-            entry["image"] = img_b64
-        else:
-            entry["html"] = _fig_to_inline_html(fig)
-        return items + [entry]
+        return items + [reports.add(entry)]
 
     # Target compliance
     if trig == "t_add":
@@ -1165,37 +1793,57 @@ def add_to_report(
             or not (t_start and t_end)
         ):
             return items
-        df, time_col = _get_df(stored)
-        if df is None:
-            return items
-        start_dt = pd.to_datetime(t_start)
-        end_dt = pd.to_datetime(t_end) + pd.Timedelta(days=1)
-        dff = df[(df[time_col] >= start_dt) & (df[time_col] < end_dt)].copy()
-        if dff.empty:
-            return items
-        low, high = t_target - t_tol, t_target + t_tol
-        below = int((dff[t_param] < low).sum())
-        within = int(((dff[t_param] >= low) & (dff[t_param] <= high)).sum())
-        above = int((dff[t_param] > high).sum())
-        pct_in = 100 * within / len(dff)
+        # KPIs ya calculados al generar (o al mover la banda); solo se
+        # recalculan si los controles cambiaron sin volver a generar
+        current = {
+            "data": stored, "param": t_param, "start": t_start, "end": t_end,
+            "target": t_target, "tol": t_tol,
+        }
+        if t_view and all(t_view.get(key) == val for key, val in current.items()):
+            k = t_view["kpis"]
+        else:
+            window = _target_window(stored, t_param, t_start, t_end)
+            if window is None or window[1] == window[2]:
+                return items
+            k, _ = _target_kpis(window, t_target, t_tol)
         summary = (
             f"Window: {t_start} to {t_end} | Target: {t_target} ±{t_tol}  →  "
-            f"Below={below}, Within={within}, Above={above}  ({pct_in:.1f}% within)"
+            f"Below={k['below']}, Within={k['within']}, Above={k['above']}  "
+            f"({k['pct_in']:.1f}% of samples, {k['pct_time_in']:.1f}% of time within) | "
+            f"Excursions below/above: {k['excursions_below']}/{k['excursions_above']}, "
+            f"longest {_fmt_hours(k['longest_excursion_h'])}, "
+            f"out of band {_fmt_hours(k['time_out_h'])}"
         )
 
-        fig = go.Figure(t_fig)
-        img_b64 = _fig_to_base64_png(fig)
         entry = {
             "type": "target",
             "title": f"Target compliance — {t_param}",
             "meta": summary,
             "summary": "",
+            "kpis": k,
+            "figure": go.Figure(t_fig),
         }
-        if img_b64:
-            entry["image"] = img_b64
-        else:
-            entry["html"] = _fig_to_inline_html(fig)
-        return items + [entry]
+        return items + [reports.add(entry)]
+
+    # All-tag compliance
+    if trig == "c_add":
+        if not c_fig or not c_view:
+            return items
+        entry = {
+            "type": "compliance",
+            "title": "Target compliance — All tags",
+            "meta": (
+                f"Window: {c_view['start']} to {c_view['end']} | "
+                f"Rolling window: {c_view['window']} days"
+            ),
+            "summary": "",
+            "table": {
+                "columns": [label for _, label in C_COLUMNS],
+                "rows": [[_fmt_stat(r[key]) for key, _ in C_COLUMNS] for r in c_view["rows"]],
+            },
+            "figure": go.Figure(c_fig),
+        }
+        return items + [reports.add(entry)]
 
     # Main time series graph
     if trig == "ts_add":
@@ -1213,71 +1861,81 @@ def add_to_report(
         ]
         meta = " | ".join(meta_parts)
 
-        fig = go.Figure(ts_fig)
-        img_b64 = _fig_to_base64_png(fig)
         entry = {
             "type": "time_series",
             "title": "Main time series graph",
             "meta": meta,
             "summary": "",
+            "figure": go.Figure(ts_fig),
         }
-        if img_b64:
-            entry["image"] = img_b64
-        else:
-            entry["html"] = _fig_to_inline_html(fig)
-        return items + [entry]
+        return items + [reports.add(entry)]
 
     return items
 
 
 # -----------------------------
-# Print report (HTML)
+# Print / export report (HTML, PDF, ZIP)
 # -----------------------------
 @dash.callback(
     Output("download-report", "data"),
     Input("btn-print-report", "n_clicks"),
+    Input("btn-export-pdf", "n_clicks"),
+    Input("btn-export-zip", "n_clicks"),
     State("report-items", "data"),
     State("project-name-store", "data"),
     prevent_initial_call=True,
+    # Render de kaleido y armado del archivo en un proceso aparte; el
+    # resultado (un archivo con fecha) no se cachea
+    background=True,
+    manager=jobs.uncached,
+    progress=[Output("report-progress", "value"), Output("report-progress", "label")],
+    running=[
+        (Output("btn-print-report", "disabled"), True, False),
+        (Output("btn-export-pdf", "disabled"), True, False),
+        (Output("btn-export-zip", "disabled"), True, False),
+        (Output("report-progress", "style"), PROGRESS_SHOWN, PROGRESS_HIDDEN),
+        (Output("cancel-report", "style"), {"marginTop": "8px"}, {"marginTop": "8px", "display": "none"}),
+    ],
+    cancel=[Input("cancel-report", "n_clicks")],
 )
-def print_report(_, items, project_name):
-    items = items or []
+def print_report(set_progress, _print, _pdf, _zip, item_ids, project_name):
+    items = reports.get_many(item_ids)
     if not items:
         return no_update
+    ctx = dash.callback_context
+    trig = ctx.triggered[0]["prop_id"].split(".")[0] if ctx.triggered else "btn-print-report"
+
     project_name = project_name or "Thickener DataWeb"
-    now = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-    needs_plotly = any("html" in it for it in items)
-
-    parts = [
-        "<html><head><meta charset='utf-8' /><title>Report</title>",
-        "<style>body{font-family:Arial,Helvetica,sans-serif;margin:24px;} ",
-        "h1{margin:0 0 8px 0;} .meta{color:#666;margin-bottom:20px;} ",
-        ".card{border:1px solid #ddd;border-radius:10px;padding:14px;margin:14px 0;} ",
-        ".img{width:100%;max-width:1200px;border:1px solid #eee;border-radius:8px;} ",
-        ".ttl{font-weight:700;font-size:18px;margin-bottom:4px;} ",
-        ".sum{color:#333;margin-top:6px;}</style>",
-    ]
-    if needs_plotly:
-        parts.append("<script src='https://cdn.plot.ly/plotly-latest.min.js'></script>")
-    parts.append("</head><body>")
-    parts.append(f"<h1>{project_name} — Analysis Report</h1>")
-    parts.append(f"<div class='meta'>Generated: {now} | Items: {len(items)}</div>")
-
-    for i, it in enumerate(items, start=1):
-        parts.append("<div class='card'>")
-        parts.append(f"<div class='ttl'>{i}. {it.get('title','')}</div>")
-        if it.get("meta"):
-            parts.append(f"<div class='meta'>{it['meta']}</div>")
-        if it.get("image"):
-            parts.append(f"<img class='img' src='{it['image']}' />")
-        elif it.get("html"):
-            parts.append(it["html"])
-        if it.get("summary"):
-            parts.append(f"<div class='sum'>{it['summary']}</div>")
-        parts.append("</div>")
-
-    parts.append("</body></html>")
-    html_str = "".join(parts)
-    ts = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    return dcc.send_string(html_str, f"{project_name}_report_{ts}.html")
+    header = {
+        "title": project_name,
+        "generated": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "count": len(items),
+    }
+    base_name = f"{project_name}_report_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+
+    def entries(fmt):
+        for n, entry in enumerate(_report_entries(items, fmt), 1):
+            set_progress((10 + int(80 * n / len(items)), f"Rendering item {n}/{len(items)}…"))
+            yield entry
+
+    set_progress((5, "Preparing report…"))
+    # Se escribe a un archivo temporal ítem por ítem y se borra al enviarlo
+    if trig == "btn-export-pdf":
+        path = report_export.write_pdf(report_export.temp_path(".pdf"), header, entries("jpeg"))
+        filename = f"{base_name}.pdf"
+    elif trig == "btn-export-zip":
+        path = report_export.write_zip(report_export.temp_path(".zip"), header, entries("png"))
+        filename = f"{base_name}.zip"
+    else:
+        # Si kaleido falla, la figura va como HTML interactivo
+        path = report_export.write_html(
+            report_export.temp_path(".html"),
+            header,
+            entries("png"),
+            fallback=lambda spec: _fig_to_inline_html(go.Figure(spec["figure"])) if spec.get("figure") else None,
+        )
+        filename = f"{base_name}.html"
+    try:
+        return dcc.send_file(path, filename=filename)
+    finally:
+        os.remove(path)
@@ -0,0 +1,9 @@
+# tests/conftest.py
+# Los tests importan core.* desde la raíz del repo y escriben datasets en un
+# directorio temporal propio (core.storage lee THICKDATA_DATA_DIR al importar)
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["THICKDATA_DATA_DIR"] = tempfile.mkdtemp(prefix="thickdata-tests-")
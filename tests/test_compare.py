@@ -0,0 +1,97 @@
+# tests/test_compare.py
+import numpy as np
+import pandas as pd
+
+from core import compare, datasets, windows
+
+
+def _frame(n=20000, seed=0):
+    rng = np.random.default_rng(seed)
+    a = rng.normal(100.0, 15.0, n)
+    b = rng.gamma(2.0, 3.0, n)
+    a[rng.random(n) < 0.1] = np.nan
+    b[:500] = np.nan
+    times = pd.date_range("2024-01-01", periods=n, freq="min")
+    return pd.DataFrame({"Time": times, "a": a, "b": b})
+
+
+def test_split_bounds_at_cut_edges():
+    times = pd.date_range("2024-01-01", periods=10, freq="h").to_numpy().copy()
+    times[-2:] = np.datetime64("NaT")
+    # Un corte exacto cae en el tramo de después (t >= corte); uno entre
+    # muestras, en la siguiente; los NaT del final no entran en ningún tramo
+    bounds = compare.split_bounds(times, ["2024-01-01 03:00", "2024-01-01 05:30"])
+    assert bounds.tolist() == [0, 3, 6, 8]
+    # Cortes desordenados, antes del inicio y después del fin
+    bounds = compare.split_bounds(times, ["2030-01-01", "2000-01-01"])
+    assert bounds.tolist() == [0, 0, 8, 8]
+
+
+def test_segment_stats_match_numpy():
+    df = _frame(3000)
+    cut = pd.Timestamp("2024-01-01 20:00")
+    bounds = compare.split_bounds(df["Time"].to_numpy(), [cut])
+    stats = compare.segment_stats(df[["a", "b"]].to_numpy(), bounds)
+    for j, col in enumerate(["a", "b"]):
+        for k, part in enumerate([df[df["Time"] < cut][col], df[df["Time"] >= cut][col]]):
+            x = part.to_numpy()
+            assert stats["n"][k, j] == np.count_nonzero(~np.isnan(x))
+            assert np.isclose(stats["mean"][k, j], np.nanmean(x))
+            assert np.isclose(stats["std"][k, j], np.nanstd(x))
+            for q in compare.PERCENTILES:
+                assert np.isclose(stats[f"p{q}"][k, j], np.nanpercentile(x, q))
+
+
+def test_indexed_stats_match_segment_stats():
+    df = _frame()
+    handle = datasets.register(df)
+    bounds = compare.split_bounds(df["Time"].to_numpy(), ["2024-01-03", "2024-01-05 07:13", "2024-01-10"])
+    direct = compare.segment_stats(df[["a", "b"]].to_numpy(), bounds)
+    indexed = compare.indexed_stats(handle, ["a", "b"], bounds)
+    for s in ("n", "mean", "std"):
+        assert np.allclose(indexed[s], direct[s], equal_nan=True)
+    # Tramos chicos: percentiles exactos
+    for q in compare.PERCENTILES:
+        assert np.allclose(indexed[f"p{q}"], direct[f"p{q}"], equal_nan=True)
+
+
+def test_indexed_stats_sketch_rank_error():
+    df = _frame(60000)
+    handle = datasets.register(df)
+    bounds = np.array([123, 59000])
+    idx = windows.get(handle, "a")
+    x = np.sort(df["a"].to_numpy()[123:59000])
+    x = x[~np.isnan(x)]
+    est = windows.quantiles(idx, 123, 59000, compare.PERCENTILES, exact=False)
+    # El rango del percentil estimado difiere en a lo sumo 1/K de la ventana
+    for q, v in zip(compare.PERCENTILES, est):
+        rank = np.searchsorted(x, v) / len(x)
+        assert abs(rank - q / 100.0) <= 1.0 / windows.SKETCH_POINTS
+    stats = compare.indexed_stats(handle, ["a"], bounds)
+    assert stats["n"][0, 0] == len(x)
+
+
+def test_compare_rows_and_delta():
+    df = _frame(3000)
+    out = compare.compare(df, ["a"], ["2024-01-01 12:00"])
+    before, after = out["rows"]
+    assert out["labels"] == ["Before", "After"]
+    assert before["delta_mean_pct"] is None
+    expected = (after["mean"] - before["mean"]) / abs(before["mean"]) * 100.0
+    assert np.isclose(after["delta_mean_pct"], expected)
+    assert before["n"] + after["n"] == int(df["a"].notna().sum())
+
+
+def test_box_stats_match_tukey():
+    df = _frame(5000)
+    handle = datasets.register(df)
+    idx = windows.get(handle, "b")
+    box = compare.box_stats(idx, 0, 5000, max_outliers=10)
+    x = df["b"].dropna().to_numpy()
+    q1, q3 = np.percentile(x, [25, 75])
+    inside = x[(x >= q1 - 1.5 * (q3 - q1)) & (x <= q3 + 1.5 * (q3 - q1))]
+    assert np.isclose(box["q1"], q1) and np.isclose(box["q3"], q3)
+    assert np.isclose(box["median"], np.median(x))
+    assert box["lowerfence"] == inside.min() and box["upperfence"] == inside.max()
+    assert box["n_outliers"] == len(x) - len(inside)
+    assert len(box["outliers"]) == min(10, box["n_outliers"])
@@ -0,0 +1,57 @@
+# tests/test_compliance.py
+import numpy as np
+import pandas as pd
+
+from core import compliance
+
+
+def _times(*stamps):
+    return pd.to_datetime(list(stamps)).to_numpy()
+
+
+def test_band_states():
+    states = compliance.band_states([0.5, 1.0, 2.0, 3.5, np.nan], 1.0, 3.0)
+    assert states.tolist() == [
+        compliance.BELOW, compliance.WITHIN, compliance.WITHIN, compliance.ABOVE, compliance.MISSING
+    ]
+
+
+def test_durations_clip_gaps():
+    t = _times("2024-01-01 00:00", "2024-01-01 00:01", "2024-01-01 00:02", "2024-01-02 00:00")
+    secs = compliance.durations(t)
+    # La última muestra pesa el intervalo típico; el hueco se recorta
+    assert secs.tolist() == [60.0, 60.0, compliance.GAP_FACTOR * 60.0, 60.0]
+
+
+def test_excursions_split_at_gap():
+    # Todo sobre la banda, con dos días sin datos en el medio
+    t = _times(
+        "2024-01-01 00:00", "2024-01-01 00:01", "2024-01-01 00:02",
+        "2024-01-03 00:00", "2024-01-03 00:01",
+    )
+    stats, events = compliance.excursions(t, np.full(5, 10.0), 0.0, 1.0)
+    assert stats["excursions_above"] == 2
+    assert stats["excursions_below"] == 0
+    assert events["start"].tolist() == _times("2024-01-01 00:00", "2024-01-03 00:00").tolist()
+    # Ninguna excursión cubre el hueco
+    assert events["end"][0] < np.datetime64("2024-01-02")
+    assert events["secs"].tolist() == [60.0 + 60.0 + compliance.GAP_FACTOR * 60.0, 120.0]
+
+
+def test_excursions_runs_and_time_weights():
+    t = pd.date_range("2024-01-01", periods=8, freq="min").to_numpy()
+    v = np.array([5.0, 11.0, 12.0, 5.0, np.nan, -1.0, -2.0, 5.0])
+    stats, events = compliance.excursions(t, v, 0.0, 10.0)
+    assert stats["excursions_above"] == 1
+    assert stats["excursions_below"] == 1
+    assert events["kind"].tolist() == [compliance.ABOVE, compliance.BELOW]
+    assert events["secs"].tolist() == [120.0, 120.0]
+    # NaN no cuenta en el % de tiempo: 3 min dentro de 7 conocidos
+    assert np.isclose(stats["pct_time_in"], 100.0 * 3 / 7)
+    assert np.isclose(stats["time_out_h"], 4 / 60)
+
+
+def test_excursions_empty():
+    stats, events = compliance.excursions(np.array([], dtype="datetime64[ns]"), np.array([]), 0.0, 1.0)
+    assert stats == {}
+    assert len(events["start"]) == 0
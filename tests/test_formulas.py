@@ -0,0 +1,66 @@
+# tests/test_formulas.py
+import numpy as np
+import pytest
+
+from core import formulas
+
+
+@pytest.mark.parametrize("expr", [
+    "__import__('os')",
+    "open('/etc/passwd')",
+    "[a].__class__",
+    "[a][0]",
+    "(lambda: 1)()",
+    "[a] if [b] else 0",
+    "[a] and [b]",
+    "'text'",
+    "True",
+    "x",
+    "np.sqrt([a])",
+    "sqrt(x=[a])",
+    "[a] < [b] < 3",
+    "[a] // 2",
+    "[a] << 2",
+    "{1: 2}",
+    "[a]; 1",
+    "",
+])
+def test_rejects_non_whitelisted_syntax(expr):
+    with pytest.raises(formulas.FormulaError):
+        formulas.compile_expr(expr)
+
+
+def test_evaluate_matches_numpy():
+    a = np.array([1.0, 4.0, np.nan, 9.0])
+    b = np.array([2.0, 0.0, 1.0, -3.0])
+    cols = {"Feed, m3/h": a, "Density": b}
+    out = formulas.evaluate("[Feed, m3/h] * [Density] / 1000 + sqrt([Feed, m3/h])", cols, 4)
+    with np.errstate(invalid="ignore"):
+        expected = a * b / 1000 + np.sqrt(a)
+    assert np.allclose(out, expected, equal_nan=True)
+    # Divisiones por cero y raíces de negativos -> NaN (no inf)
+    out = formulas.evaluate("[Feed, m3/h] / [Density] + sqrt([Density])", cols, 4)
+    assert np.isnan(out[1]) and np.isnan(out[3])
+    out = formulas.evaluate("where([Density] > 0, 1, -1) + max([Feed, m3/h], 5)", cols, 4)
+    assert out.tolist() == [6.0, 4.0, 6.0, 8.0]
+
+
+def test_constant_broadcast_and_overflow():
+    assert formulas.evaluate("2 * 3", {}, 3).tolist() == [6.0, 6.0, 6.0]
+    # Constantes float: desborda a error en vez de armar un entero gigante
+    with pytest.raises(formulas.FormulaError):
+        formulas.evaluate("10 ** 10 ** 10", {}, 1)
+
+
+def test_unknown_tag():
+    with pytest.raises(formulas.FormulaError, match="Unknown tag"):
+        formulas.evaluate("[missing] + 1", {"a": np.zeros(2)}, 2)
+
+
+def test_parse_and_check_text():
+    text = "# comentario\nA = [x] * 2\n\nB = [A] >= 1\nC = [nope]"
+    assert formulas.parse_text(text) == [(2, "A", "[x] * 2"), (4, "B", "[A] >= 1"), (5, "C", "[nope]")]
+    results = formulas.check_text(text, ["x"])
+    assert [r[2] is None for r in results] == [True, True, False]
+    with pytest.raises(formulas.FormulaError):
+        formulas.parse_text("just an expression")
@@ -0,0 +1,46 @@
+# tests/test_pyramid.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import datasets, pyramid
+
+
+@pytest.fixture(scope="module")
+def raw():
+    rng = np.random.default_rng(2)
+    n = 20000
+    # Muestreo irregular, con NaN y huecos
+    times = pd.Timestamp("2024-01-01 00:03") + pd.to_timedelta(np.cumsum(rng.integers(1, 120, n)), unit="s")
+    a = rng.normal(10.0, 2.0, n)
+    a[rng.random(n) < 0.1] = np.nan
+    b = np.where(rng.random(n) < 0.5, np.nan, rng.gamma(2.0, 1.0, n))
+    return pd.DataFrame({"Time": times, "a": a, "b": b})
+
+
+@pytest.mark.parametrize("rule", pyramid.LEVELS)
+def test_levels_match_resample_mean(raw, rule):
+    handle = datasets.register(raw)
+    level = pyramid.get_level(handle, rule)
+    expected = raw.set_index("Time").resample(pyramid._pandas_rule(rule)).mean()
+    got = level.set_index(level.columns[0])
+    assert list(got.index) == list(expected.index)
+    for col in ("a", "b"):
+        assert np.allclose(got[col].to_numpy(), expected[col].to_numpy(), equal_nan=True)
+
+
+def test_overlay_reuses_base_levels(raw):
+    handle = datasets.register(raw)
+    pyramid.build(handle)
+    derived = raw["a"].to_numpy() * 2.0
+    overlay = datasets.register_overlay(handle, {"a2": derived})
+    level = pyramid.get_level(overlay, "1H", columns=["a", "a2"])
+    expected = raw.assign(a2=derived).set_index("Time").resample("1h").mean()
+    assert np.allclose(level["a"].to_numpy(), expected["a"].to_numpy(), equal_nan=True)
+    assert np.allclose(level["a2"].to_numpy(), expected["a2"].to_numpy(), equal_nan=True)
+
+
+def test_unknown_rule_or_handle(raw):
+    handle = datasets.register(raw)
+    assert pyramid.get_level(handle, "3min") is None
+    assert pyramid.get_level({"id": "../x", "version": 0}, "1H") is None
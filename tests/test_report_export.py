@@ -0,0 +1,76 @@
+# tests/test_report_export.py
+import csv
+import io
+import re
+import zipfile
+
+from core import report_export
+
+HEADER = {"title": "Planta Norte", "generated": "2024-01-01 10:00", "count": 2}
+
+
+# Encabezado JPEG mínimo (SOI + APP0 + SOF0): alcanza para el tamaño y el XObject
+def _jpeg(w, h):
+    app0 = b"\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof0 = b"\xff\xc0\x00\x11\x08" + h.to_bytes(2, "big") + w.to_bytes(2, "big") + b"\x03" + b"\x00" * 9
+    return b"\xff\xd8" + app0 + sof0 + b"\xff\xd9"
+
+
+def _entries():
+    table = {"columns": ["Segment", "mean"], "rows": [[f"S{i}", f"{i}.0"] for i in range(20)]}
+    return [
+        ({"title": "Densidad (kg/m³) → %S", "meta": "a ≥ b", "kpis": {}}, _jpeg(640, 480)),
+        ({"title": "Before vs After (x)", "table": table}, None),
+    ]
+
+
+def test_jpeg_size():
+    assert report_export._jpeg_size(_jpeg(640, 480)) == (640, 480)
+    assert report_export._jpeg_size(b"\xff\xd8\xff\xd9") is None
+
+
+def test_pdf_structure(tmp_path):
+    path = report_export.write_pdf(str(tmp_path / "r.pdf"), HEADER, _entries())
+    data = open(path, "rb").read()
+    assert data.startswith(b"%PDF-1.4")
+    assert data.endswith(b"%%EOF\n")
+
+    # startxref apunta a la tabla y cada offset al inicio de su objeto
+    xref = int(re.search(rb"startxref\n(\d+)\n", data).group(1))
+    assert data[xref:xref + 5] == b"xref\n"
+    count = int(re.search(rb"xref\n0 (\d+)\n", data).group(1))
+    entries = re.findall(rb"(\d{10}) 00000 n \n", data[xref:])
+    assert len(entries) == count - 1
+    for obj_id, off in enumerate(entries, start=1):
+        assert data[int(off):].startswith(f"{obj_id} 0 obj\n".encode())
+
+    # Portada + un ítem por página; la imagen con su tamaño real
+    assert b"/Count 3" in data
+    assert b"/Width 640 /Height 480" in data
+    # Texto en WinAnsi, paréntesis escapados, tabla cortada
+    assert "(kg/m³) -> %S".replace("(", "\\(").replace(")", "\\)").encode("cp1252") in data
+    assert b"a >= b" in data
+    assert rb"\(image not available\)" in data
+    assert b"4 more rows" in data
+
+
+def test_zip_contents(tmp_path):
+    path = report_export.write_zip(str(tmp_path / "r.zip"), HEADER, _entries(), ext="jpg")
+    with zipfile.ZipFile(path) as zf:
+        names = set(zf.namelist())
+        assert {"report.html", "kpis.csv", "images/001.jpg", "tables/002.csv"} <= names
+        assert "images/002.jpg" not in names
+        rows = list(csv.reader(io.StringIO(zf.read("tables/002.csv").decode())))
+        assert len(rows) == 21
+        html = zf.read("report.html").decode()
+        assert "src='images/001.jpg'" in html
+
+
+def test_html_fallback(tmp_path):
+    path = report_export.write_html(
+        str(tmp_path / "r.html"), HEADER, _entries(), fallback=lambda spec: "<div>interactive</div>"
+    )
+    html = open(path, encoding="utf-8").read()
+    assert html.count("data:image/png;base64,") == 1
+    assert "<div>interactive</div>" in html
+    assert html.endswith("</body></html>")
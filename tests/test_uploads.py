@@ -0,0 +1,120 @@
+# tests/test_uploads.py
+import io
+import json
+import os
+import time
+import uuid
+
+import pytest
+
+from core import uploads
+
+
+def _token():
+    return uuid.uuid4().hex
+
+
+@pytest.fixture
+def no_parse(monkeypatch):
+    started = []
+    monkeypatch.setattr(uploads, "_start_parse", started.append)
+    return started
+
+
+def test_write_chunk_in_order(no_parse):
+    token, data = _token(), b"0123456789"
+    assert uploads.write_chunk(token, 0, len(data), io.BytesIO(data[:4]), "a.csv") == 4
+    assert uploads.received(token) == 4
+    assert not uploads.is_complete(token)
+    assert uploads.write_chunk(token, 4, len(data), io.BytesIO(data[4:])) == len(data)
+    assert uploads.is_complete(token)
+    assert no_parse == [token]
+    with open(uploads._path(token, ".bin"), "rb") as fh:
+        assert fh.read() == data
+    # Reenviar un trozo de una subida completa no cambia nada
+    assert uploads.write_chunk(token, 0, len(data), io.BytesIO(data[:4])) == len(data)
+    assert no_parse == [token]
+
+
+def test_write_chunk_out_of_order(no_parse):
+    token, data = _token(), b"abcdefgh"
+    uploads.write_chunk(token, 0, len(data), io.BytesIO(data[:3]))
+    # Un trozo adelantado o repetido no se escribe: se devuelve dónde seguir
+    assert uploads.write_chunk(token, 6, len(data), io.BytesIO(data[6:])) == 3
+    assert uploads.write_chunk(token, 0, len(data), io.BytesIO(data[:3])) == 3
+    assert uploads.received(token) == 3
+    assert uploads.write_chunk(token, 3, len(data), io.BytesIO(data[3:])) == len(data)
+    with open(uploads._path(token, ".bin"), "rb") as fh:
+        assert fh.read() == data
+
+
+def test_write_chunk_oversized(no_parse):
+    token = _token()
+    with pytest.raises(uploads.UploadError):
+        uploads.write_chunk(token, 0, 4, io.BytesIO(b"too long"))
+    with pytest.raises(uploads.UploadError):
+        uploads.write_chunk(token, 0, uploads.MAX_UPLOAD_BYTES + 1, io.BytesIO(b"x"))
+    with pytest.raises(uploads.UploadError):
+        uploads.write_chunk(token, 0, -1, io.BytesIO(b"x"))
+    assert not uploads.is_complete(token)
+
+
+def test_invalid_token():
+    with pytest.raises(uploads.UploadError):
+        uploads.write_chunk("../x", 0, 1, io.BytesIO(b"x"))
+    with pytest.raises(uploads.UploadError):
+        uploads.poll("../x")
+
+
+def test_poll_states(no_parse):
+    token = _token()
+    with pytest.raises(uploads.UploadError):
+        uploads.poll(token)
+    # .bin recién llegado, sin .pid todavía: en curso
+    uploads.write_chunk(token, 0, 3, io.BytesIO(b"abc"))
+    assert uploads.poll(token) is None
+    # El dueño murió sin dejar resultado: error (no espera hasta el timeout)
+    with open(uploads._path(token, ".pid"), "w", encoding="utf-8") as fh:
+        json.dump({"pid": 2**31 - 2, "created": 0.0}, fh)
+    with pytest.raises(uploads.UploadError, match="interrupted"):
+        uploads.poll(token)
+    assert not os.path.exists(uploads._path(token, ".bin"))
+    with pytest.raises(uploads.UploadError, match="interrupted"):
+        uploads.poll(token)
+
+
+def test_poll_orphan_without_pid(no_parse):
+    token = _token()
+    uploads.write_chunk(token, 0, 3, io.BytesIO(b"abc"))
+    old = time.time() - 2 * uploads._START_GRACE_S
+    os.utime(uploads._path(token, ".bin"), (old, old))
+    with pytest.raises(uploads.UploadError, match="interrupted"):
+        uploads.poll(token)
+
+
+def test_prune_removes_old_files(no_parse):
+    stale, fresh = _token(), _token()
+    uploads.write_chunk(stale, 0, 10, io.BytesIO(b"abc"), "old.csv")
+    old = time.time() - uploads.UPLOAD_TTL_HOURS * 3600 - 60
+    for suffix in (".part", ".name"):
+        os.utime(uploads._path(stale, suffix), (old, old))
+    uploads.write_chunk(fresh, 0, 10, io.BytesIO(b"abc"))
+    assert not os.path.exists(uploads._path(stale, ".part"))
+    assert not os.path.exists(uploads._path(stale, ".name"))
+    assert stale not in uploads._token_locks
+    assert uploads.received(fresh) == 3
+
+
+def test_upload_parses_in_child_process():
+    token = _token()
+    rows = "\n".join(f"x,x,x,2024-01-01 {h:02d}:00,{h}" for h in range(24))
+    data = ("\n" * 6 + "x,x,x,Time,a\n" + rows + "\n").encode()
+    uploads.write_chunk(token, 0, len(data), io.BytesIO(data), "a.csv")
+    deadline = time.time() + 60
+    handle = None
+    while handle is None and time.time() < deadline:
+        handle = uploads.poll(token)
+        time.sleep(0.1)
+    assert handle is not None
+    assert not os.path.exists(uploads._path(token, ".bin"))
+    assert not os.path.exists(uploads._path(token, ".pid"))
@@ -0,0 +1,132 @@
+# tests/test_windows.py
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import datasets, windows
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.default_rng(1)
+    n = 3 * windows.SKETCH_BLOCK + 517
+    v = rng.normal(50.0, 10.0, n)
+    v[rng.random(n) < 0.05] = np.nan
+    v[::11] = np.round(v[::11])   # valores repetidos justo en los umbrales
+    times = pd.date_range("2024-01-01", periods=n, freq="min").to_numpy().copy()
+    times[-20:] = np.datetime64("NaT")
+    df = pd.DataFrame({"Time": times, "v": v})
+    handle = datasets.register(df)
+    idx = windows.get(handle, "v")
+    return handle, idx, np.asarray(idx["values"])
+
+
+def _windows(n):
+    B = windows.SKETCH_BLOCK
+    return [(0, 0), (0, n), (B, 2 * B), (B - 1, 2 * B + 1), (17, 18), (n - 5, n), (123, 3 * B + 400)]
+
+
+def test_nat_rows_left_out(data):
+    _, idx, values = data
+    assert len(values) == len(idx["time"]) == 3 * windows.SKETCH_BLOCK + 517 - 20
+
+
+def test_moments_match_numpy(data):
+    _, idx, values = data
+    for i, j in _windows(len(values)):
+        m = windows.moments(idx, i, j)
+        x = values[i:j][~np.isnan(values[i:j])]
+        assert m["count"] == len(x)
+        if len(x):
+            assert np.isclose(m["mean"], x.mean())
+            assert np.isclose(m["std"], x.std())
+        else:
+            assert np.isnan(m["mean"])
+
+
+def test_segment_moments_match_moments(data):
+    _, idx, values = data
+    edges = [0, 10, 4096, 5000, 9000, len(values)]
+    seg = windows.segment_moments(idx, edges)
+    for k in range(len(edges) - 1):
+        m = windows.moments(idx, edges[k], edges[k + 1])
+        assert seg["count"][k] == m["count"]
+        assert np.isclose(seg["mean"][k], m["mean"])
+        assert np.isclose(seg["std"][k], m["std"])
+
+
+@pytest.mark.parametrize("low, high", [(40.0, 60.0), (50.0, 50.0), (-1e9, 1e9), (70.0, 30.0)])
+def test_threshold_counts_match_masks(data, low, high):
+    _, idx, values = data
+    for i, j in _windows(len(values)):
+        x = values[i:j]
+        expected = (
+            int(np.count_nonzero(x < low)),
+            int(np.count_nonzero(~np.isnan(x))) - int(np.count_nonzero(x < low)) - int(np.count_nonzero(x > high)),
+            int(np.count_nonzero(x > high)),
+        )
+        assert windows.threshold_counts(idx, i, j, low, high) == expected
+
+
+def test_band_counts_per_day(data):
+    _, idx, values = data
+    # El tiempo del índice está en ns (int64), como en compliance.batch
+    days = pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-03"]).asi8
+    edges = np.searchsorted(idx["time"], days, side="left")
+    below, within, above = windows.band_counts(idx, edges, 45.0, 55.0)
+    for k in range(2):
+        x = values[edges[k]:edges[k + 1]]
+        assert below[k] == np.count_nonzero(x < 45.0)
+        assert above[k] == np.count_nonzero(x > 55.0)
+        assert within[k] == np.count_nonzero((x >= 45.0) & (x <= 55.0))
+
+
+def test_bounds(data):
+    _, idx, _ = data
+    i, j = windows.bounds(idx, "2024-01-01 01:00", "2024-01-01 02:00")
+    assert (i, j) == (60, 120)
+
+
+def test_quantiles_exact_and_sketch(data):
+    _, idx, values = data
+    qs = [5, 50, 95]
+    i, j = 100, len(values) - 3
+    x = values[i:j]
+    x = np.sort(x[~np.isnan(x)])
+    assert np.allclose(windows.quantiles(idx, i, j, qs, exact=True), np.percentile(x, qs))
+    est = windows.quantiles(idx, i, j, qs, exact=False)
+    for q, e in zip(qs, est):
+        assert abs(np.searchsorted(x, e) / len(x) - q / 100.0) <= 1.0 / windows.SKETCH_POINTS
+    assert np.isnan(windows.quantiles(idx, 5, 5, qs)).all()
+
+
+def test_concurrent_builds(tmp_path):
+    n = 2 * windows.SKETCH_BLOCK
+    df = pd.DataFrame({
+        "Time": pd.date_range("2024-01-01", periods=n, freq="min"),
+        "a": np.arange(n, dtype="float64"),
+        "b": np.ones(n),
+    })
+    handle = datasets.register(df)
+    errors = []
+
+    def run():
+        try:
+            windows.build(handle)
+        except Exception as e:  # pragma: no cover - solo si falla
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert windows.moments(windows.get(handle, "a"), 0, n)["count"] == n
+
+
+def test_invalid_handle():
+    assert windows.get({"id": "../..", "version": 0}, "a") is None
+    assert windows.get(None, "a") is None